@@ -0,0 +1,206 @@
+"""
+FusionSim Analytic Backend
+--------------------------
+Closed-form solutions of the 1D simulations for interactive previews.
+
+The simulation types start from a Gaussian pulse A·exp(-(x - x0)² / w) with
+w = 10·dx² (see problems.py). On an unbounded domain a Gaussian stays
+Gaussian under diffusion, so the state at time t is
+
+    u(x, t) = A · sqrt(w / s) · exp(-(x - x0)² / s),   s = w + 4·D·t
+
+with D the coefficient of the diffusion term (k for the heat equation). Each
+stored timestep is one vectorized evaluation, independent of dt and steps.
+Other initial profiles are rejected, and so are equations with an advection
+term: the solvers use FiPy's AdvectionTerm, u·|∇φ|, which moves the level
+sets of the pulse outward rather than translating it, and has no such
+closed form.
+
+The boundaries are ignored, so the solution is only used while the pulse
+stays far from them: at every time of the run, the value the pulse would
+have at the nearer boundary must be below BOUNDARY_TOLERANCE of its peak.
+The numerical solvers also carry a time discretization error, so the two
+differ by more than round-off; analytic_deviation() measures by how much.
+"""
+
+import math
+from typing import Dict, Iterator, Optional, Tuple, Union
+import numpy as np
+
+from numpy_backend import cell_centers, stored_steps
+from problems import ProblemSpec, gaussian_width, get_problem
+
+# Largest value of the pulse at the nearer boundary, relative to its peak, for which
+# the boundaries are negligible
+BOUNDARY_TOLERANCE = 1e-4
+
+
+def check_analytic_problem(problem: ProblemSpec) -> None:
+    """
+    Check that a problem has a closed-form solution.
+
+    Raises:
+        ValueError: If the initial condition is not a Gaussian or the equation has an advection term
+    """
+    if problem.initial_condition != "gaussian":
+        raise ValueError("The analytic backend needs the gaussian initial condition")
+    if problem.advected:
+        raise ValueError("The analytic backend has no closed form for the advection term; use a numerical backend")
+
+
+def _pulse(
+    problem: ProblemSpec,
+    nx: int,
+    dx: float,
+    coefficients: Dict[str, float]
+) -> Tuple[float, float, float, float]:
+    """
+    Return the amplitude, initial center, initial width and diffusivity of a pulse.
+
+    Raises:
+        ValueError: If the initial condition is not a Gaussian or the equation has an advection term
+    """
+    check_analytic_problem(problem)
+    return problem.amplitude, problem.center * nx * dx, gaussian_width(dx), coefficients[problem.diffusivity]
+
+
+def analytic_applicable(
+    simulation_type: Union[str, ProblemSpec],
+    nx: int,
+    dx: float,
+    steps: int,
+    dt: float,
+    D: Optional[float] = None,
+    k: Optional[float] = None,
+    velocity: Optional[float] = None
+) -> bool:
+    """
+    Check whether the pulse stays far enough from the boundaries for the closed-form solution.
+
+    Args:
+        simulation_type: "diffusion", "heat", "advection_diffusion" or a ProblemSpec
+        nx: Number of cells
+        dx: Cell size
+        steps: Number of time steps
+        dt: Time step size
+        D, k, velocity: Coefficients of the simulation type
+
+    Returns:
+        True if the pulse stays below BOUNDARY_TOLERANCE of its peak at both boundaries
+        for the whole run
+
+    Raises:
+        ValueError: If the initial condition is not a Gaussian, the equation has an advection
+            term or a coefficient is missing
+    """
+    problem = get_problem(simulation_type)
+    _, center, width, diffusivity = _pulse(problem, nx, dx, problem.coefficients(D=D, k=k, velocity=velocity))
+    # The pulse only spreads, so the end of the run is the worst case
+    distance = min(center, nx * dx - center)
+    spread = width + 4 * diffusivity * steps * dt
+    return distance ** 2 / spread >= math.log(1 / BOUNDARY_TOLERANCE)
+
+
+def check_applicable(
+    simulation_type: Union[str, ProblemSpec],
+    nx: int,
+    dx: float,
+    steps: int,
+    dt: float,
+    D: Optional[float] = None,
+    k: Optional[float] = None,
+    velocity: Optional[float] = None
+) -> None:
+    """
+    Check that the closed-form solution can be used for a run.
+
+    Raises:
+        ValueError: If analytic_applicable raises or returns False
+    """
+    if not analytic_applicable(simulation_type, nx, dx, steps, dt, D=D, k=k, velocity=velocity):
+        raise ValueError(
+            "The analytic backend needs the pulse to stay away from the boundaries; "
+            "use fewer steps, a larger domain or a numerical backend"
+        )
+
+
+def iter_analytic_simulation(
+    simulation_type: Union[str, ProblemSpec],
+    nx: int = 50,
+    dx: float = 1.0,
+    D: Optional[float] = None,
+    k: Optional[float] = None,
+    velocity: Optional[float] = None,
+    steps: int = 100,
+    dt: float = 0.1,
+    store_steps: int = 10
+) -> Iterator[np.ndarray]:
+    """
+    Evaluate the closed-form solution at each stored timestep of a run.
+
+    Parameters are expected to have been validated by the caller; see
+    diffusion_simulation.run_simulation. Timesteps are stored at the same
+    times step * dt as the numerical backends.
+
+    Yields:
+        A new array of shape (nx,) for each stored timestep
+
+    Raises:
+        ValueError: If the initial condition is not a Gaussian, the equation has an advection
+            term or the pulse comes too close to a boundary (see analytic_applicable)
+    """
+    check_applicable(simulation_type, nx, dx, steps, dt, D=D, k=k, velocity=velocity)
+    problem = get_problem(simulation_type)
+    amplitude, center, width, diffusivity = _pulse(problem, nx, dx, problem.coefficients(D=D, k=k, velocity=velocity))
+    x = cell_centers(nx, dx)
+    for step in stored_steps(steps, store_steps):
+        t = step * dt
+        spread = width + 4 * diffusivity * t
+        yield amplitude * math.sqrt(width / spread) * np.exp(-((x - center) ** 2) / spread)
+
+
+def analytic_deviation(
+    simulation_type: str,
+    nx: int = 50,
+    dx: float = 1.0,
+    steps: int = 100,
+    dt: float = 0.1,
+    store_steps: int = 10,
+    backend: str = "numpy",
+    boundary: Optional[str] = None,
+    **coefficients: float
+) -> float:
+    """
+    Run a numerical backend and return its largest deviation from the closed-form solution.
+
+    Args:
+        simulation_type: Type of simulation to run
+        nx, dx, steps, dt, store_steps: As for run_simulation
+        backend: Numerical backend to compare with, "numpy" or "fipy"
+        boundary: Boundary condition of the numerical run, defaults to that of the simulation type
+        **coefficients: D, k and velocity as needed by the simulation type
+
+    Returns:
+        Largest absolute difference over all stored timesteps, relative to the initial peak
+
+    Raises:
+        ValueError: If the analytic backend is not applicable to the run
+    """
+    from diffusion_simulation import run_simulation
+
+    params = dict(nx=nx, dx=dx, steps=steps, dt=dt, store_steps=store_steps, **coefficients)
+    exact = run_simulation(simulation_type, backend="analytic", **params)
+    numerical = run_simulation(simulation_type, backend=backend, boundary=boundary, **params)
+    return float(np.max(np.abs(exact - numerical)) / np.max(np.abs(exact[0])))
+
+
+if __name__ == "__main__":
+    # Report the deviation of the numerical backends from the closed-form solution
+    cases = {
+        "diffusion": {"nx": 200, "D": 1.0},
+        "heat": {"nx": 200, "k": 1.0},
+    }
+    for simulation_type, params in cases.items():
+        for backend in ("numpy", "fipy"):
+            deviation = analytic_deviation(simulation_type, steps=100, store_steps=10, backend=backend, **params)
+            print(f"{simulation_type} ({backend}): max deviation from the analytic solution = {deviation:.3e}")
@@ -0,0 +1,332 @@
+"""
+FusionSim Animation Formats
+---------------------------
+Encoders that turn simulation results into an animation for the client.
+
+Raster formats encode the frames rendered by matplotlib:
+1. "gif": an animated GIF quantized to one palette shared by all frames
+2. "apng": an animated PNG with the same palette, lossless and usually smaller
+3. "webm" and "mp4": VP9 and H.264 video, much smaller for long runs. They
+   need the optional imageio-ffmpeg package, which bundles an ffmpeg binary.
+
+Data formats skip matplotlib and are drawn by the client:
+4. "svg": a self-contained SVG whose curve steps through the timesteps (1D only)
+5. "json": the timesteps as numbers, with the title, labels and value limits
+
+Curves with more cells than the drawing has pixels across are decimated with
+envelope_indices() before they are drawn: each pixel column keeps the lowest
+and the highest cell it covers, so drawing cost no longer grows with nx and
+peaks are drawn at their exact height.
+
+The shared palette is built from the first frame, which already holds every
+static element (axes, labels, color bar); later frames are mapped onto it
+without dithering. Pillow then only stores the region that changed between
+frames, so GIF and APNG encoding is far cheaper than quantizing each frame on
+its own.
+"""
+
+import json
+import math
+import os
+import tempfile
+from io import BytesIO
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+try:
+    import imageio_ffmpeg
+except ImportError:  # Optional dependency, only needed for webm and mp4
+    imageio_ffmpeg = None
+
+AnimationFormat = Literal["gif", "apng", "webm", "mp4", "svg", "json"]
+ANIMATION_FORMATS = ("gif", "apng", "webm", "mp4", "svg", "json")
+
+# Formats encoded from rendered frames, and those of them written by ffmpeg
+RASTER_FORMATS = ("gif", "apng", "webm", "mp4")
+VIDEO_FORMATS = ("webm", "mp4")
+
+MEDIA_TYPES = {
+    "gif": "image/gif",
+    "apng": "image/apng",
+    "webm": "video/webm",
+    "mp4": "video/mp4",
+    "svg": "image/svg+xml",
+    "json": "application/json",
+}
+
+# Display time of one frame
+FRAME_DURATION_MS = 300
+
+# Colors of the palette shared by all GIF and APNG frames
+PALETTE_COLORS = 256
+
+# ffmpeg codec of each video format; frame sizes are padded to a multiple of the block size
+_VIDEO_CODECS = {"webm": "libvpx-vp9", "mp4": "libx264"}
+_VIDEO_BLOCK_SIZE = 8
+
+# Significant digits of the values in the "json" format
+JSON_DIGITS = 5
+
+# Size of the SVG drawing, and the most points drawn per curve
+SVG_WIDTH = 800
+SVG_HEIGHT = 480
+SVG_MAX_POINTS = 1000
+
+# Resolution of rendered frames in dots per inch, at full size and in preview mode
+RENDER_DPI = 100
+PREVIEW_DPI = 50
+
+# Runs of cells decimated per pixel column of a rendered curve; more than one keeps the
+# antialiased shading of steep parts closer to that of the full curve
+ENVELOPE_RUNS_PER_PIXEL = 2
+
+
+def envelope_indices(values: np.ndarray, columns: int) -> np.ndarray:
+    """
+    Pick the cells that draw a curve exactly at a given horizontal resolution.
+
+    The cells are split into at most ``columns`` runs of equal length, one
+    per pixel column, and the lowest and highest cell of each run are kept
+    in their order along the curve. A line through the kept cells covers the
+    same pixels in every column as a line through all of them, so extremes
+    such as a narrow peak are never lost, unlike with evenly spaced cells.
+
+    Args:
+        values: Values of shape (nx,)
+        columns: Number of pixel columns the curve is drawn across
+
+    Returns:
+        Increasing cell indices: all nx cells if nx <= 2 * columns, otherwise two per run
+    """
+    nx = values.shape[-1]
+    if nx <= 2 * max(columns, 1):
+        return np.arange(nx)
+
+    run = -(-nx // columns)
+    full = nx - nx % run
+    starts = np.arange(0, nx, run)
+    runs = values[:full].reshape(-1, run)
+    lows = starts[:len(runs)] + runs.argmin(axis=1)
+    highs = starts[:len(runs)] + runs.argmax(axis=1)
+    if full < nx:
+        tail = values[full:]
+        lows = np.append(lows, full + tail.argmin())
+        highs = np.append(highs, full + tail.argmax())
+    return np.sort(np.stack([lows, highs], axis=1), axis=1).ravel()
+
+
+def available_formats() -> Tuple[str, ...]:
+    """Return the animation formats that can be encoded with the installed packages."""
+    if imageio_ffmpeg is None:
+        return tuple(fmt for fmt in ANIMATION_FORMATS if fmt not in VIDEO_FORMATS)
+    return ANIMATION_FORMATS
+
+
+class FrameEncoder:
+    """
+    Encodes rendered RGB frames into a raster animation.
+
+    Frames are appended one at a time; ``finish()`` returns the encoded bytes.
+    """
+
+    def __init__(self, fmt: AnimationFormat, frame_duration_ms: int = FRAME_DURATION_MS):
+        """
+        Args:
+            fmt: One of RASTER_FORMATS
+            frame_duration_ms: Display time of one frame
+
+        Raises:
+            ValueError: If the format is not a raster format or is unavailable
+        """
+        if fmt not in RASTER_FORMATS:
+            raise ValueError(f"Unknown raster animation format: {fmt}")
+        if fmt in VIDEO_FORMATS and imageio_ffmpeg is None:
+            raise ValueError(f"The {fmt} format requires the imageio-ffmpeg package")
+
+        self.fmt = fmt
+        self.frame_duration_ms = frame_duration_ms
+        self._palette: Optional[Any] = None
+        self._images: List[Any] = []
+        self._video_path: Optional[str] = None
+        self._video_writer: Optional[Any] = None
+
+    def append(self, frame: np.ndarray) -> None:
+        """Add an RGB frame of shape (height, width, 3)."""
+        if self.fmt in VIDEO_FORMATS:
+            self._append_video(frame)
+        else:
+            self._append_image(frame)
+
+    def finish(self) -> bytes:
+        """Encode the appended frames and return the animation."""
+        if self.fmt in VIDEO_FORMATS:
+            return self._finish_video()
+        if not self._images:
+            raise ValueError("An animation needs at least one frame")
+
+        buffer = BytesIO()
+        first, rest = self._images[0], self._images[1:]
+        if self.fmt == "gif":
+            first.save(
+                buffer, format="GIF", save_all=True, append_images=rest,
+                duration=self.frame_duration_ms, loop=0, optimize=False
+            )
+        else:
+            first.save(
+                buffer, format="PNG", save_all=True, append_images=rest,
+                duration=self.frame_duration_ms, loop=0, default_image=False
+            )
+        self._images = []
+        return buffer.getvalue()
+
+    def _append_image(self, frame: np.ndarray) -> None:
+        from PIL import Image
+
+        image = Image.fromarray(frame)
+        if self._palette is None:
+            self._palette = image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+            self._images.append(self._palette)
+        else:
+            self._images.append(image.quantize(palette=self._palette, dither=Image.Dither.NONE))
+
+    def _append_video(self, frame: np.ndarray) -> None:
+        if self._video_writer is None:
+            import imageio.v2 as imageio
+
+            # ffmpeg writes to a file; it is read back and removed by finish()
+            fd, self._video_path = tempfile.mkstemp(suffix=f".{self.fmt}")
+            os.close(fd)
+            self._video_writer = imageio.get_writer(
+                self._video_path, format="FFMPEG", mode="I", fps=1000 / self.frame_duration_ms,
+                codec=_VIDEO_CODECS[self.fmt], macro_block_size=_VIDEO_BLOCK_SIZE
+            )
+        self._video_writer.append_data(frame)
+
+    def _finish_video(self) -> bytes:
+        if self._video_writer is None:
+            raise ValueError("An animation needs at least one frame")
+        try:
+            self._video_writer.close()
+            with open(self._video_path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(self._video_path)
+            self._video_writer = None
+
+
+def encode_json(
+    results: np.ndarray,
+    dx: float,
+    title: str,
+    value_label: str,
+    limits: Tuple[float, float],
+    frame_duration_ms: int = FRAME_DURATION_MS
+) -> bytes:
+    """
+    Encode results as a JSON document for the client to plot.
+
+    Values are rounded to JSON_DIGITS significant digits of the largest
+    absolute value, which keeps the document small.
+
+    Args:
+        results: Array of shape (frames, nx) or (frames, ny, nx)
+        dx: Cell size
+        title: Plot title
+        value_label: Name of the plotted quantity
+        limits: Minimum and maximum of the results
+        frame_duration_ms: Suggested display time of one frame
+
+    Returns:
+        UTF-8 encoded JSON with the keys title, value_label, nx, ny (null in 1D),
+        dx, limits, frame_duration_ms and frames (nested lists of values)
+    """
+    scale = max(abs(limits[0]), abs(limits[1]))
+    decimals = JSON_DIGITS - 1 - math.floor(math.log10(scale)) if scale > 0 and math.isfinite(scale) else JSON_DIGITS
+    document: Dict[str, Any] = {
+        "title": title,
+        "value_label": value_label,
+        "nx": int(results.shape[-1]),
+        "ny": int(results.shape[1]) if results.ndim == 3 else None,
+        "dx": dx,
+        "limits": list(limits),
+        "frame_duration_ms": frame_duration_ms,
+        "frames": [np.round(np.asarray(frame, dtype=np.float64), decimals).tolist() for frame in results],
+    }
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def encode_svg(
+    results: np.ndarray,
+    dx: float,
+    title: str,
+    value_label: str,
+    limits: Tuple[float, float],
+    frame_duration_ms: int = FRAME_DURATION_MS
+) -> bytes:
+    """
+    Encode 1D results as an animated SVG line plot.
+
+    The curve is one polyline whose points step through the timesteps with a
+    discrete SMIL animation, so browsers play it without any script. Curves
+    with more than SVG_MAX_POINTS cells are drawn through the min/max envelope
+    of each frame (see envelope_indices), SVG_MAX_POINTS points per frame.
+
+    Args:
+        results: Array of shape (frames, nx)
+        dx: Cell size
+        title: Plot title
+        value_label: Name of the plotted quantity, the label of the y axis
+        limits: Minimum and maximum of the results
+        frame_duration_ms: Display time of one frame
+
+    Returns:
+        UTF-8 encoded SVG document
+
+    Raises:
+        ValueError: If the results are not 1D
+    """
+    if results.ndim != 2:
+        raise ValueError("The svg format is only available for 1D results")
+
+    frames, nx = results.shape
+    left, right, top, bottom = 70, SVG_WIDTH - 20, 40, SVG_HEIGHT - 50
+    length = nx * dx
+
+    # Same value range as the rendered line plot, widened if the results are constant
+    y_min, y_max = limits[0] * 0.9, limits[1] * 1.1
+    if not y_max > y_min:
+        y_min, y_max = limits[0] - 1.0, limits[1] + 1.0
+
+    def points(values: np.ndarray) -> str:
+        values = np.asarray(values)
+        cells = envelope_indices(values, SVG_MAX_POINTS // 2)
+        x_pixels = left + (cells + 0.5) / nx * (right - left)
+        y_pixels = bottom - (values[cells] - y_min) / (y_max - y_min) * (bottom - top)
+        return " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(x_pixels, y_pixels))
+
+    curves = [points(frame) for frame in results]
+    animation = ""
+    if frames > 1:
+        animation = (
+            f'<animate attributeName="points" dur="{frames * frame_duration_ms}ms" calcMode="discrete" '
+            f'repeatCount="indefinite" values="{";".join(curves)}"/>'
+        )
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{SVG_HEIGHT}" '
+        f'viewBox="0 0 {SVG_WIDTH} {SVG_HEIGHT}" font-family="sans-serif" font-size="12">',
+        f'<rect x="{left}" y="{top}" width="{right - left}" height="{bottom - top}" fill="white" stroke="black"/>',
+        f'<text x="{(left + right) / 2}" y="{top - 15}" text-anchor="middle" font-size="16">{escape(title)}</text>',
+        f'<text x="{(left + right) / 2}" y="{SVG_HEIGHT - 10}" text-anchor="middle">Position</text>',
+        f'<text x="15" y="{(top + bottom) / 2}" text-anchor="middle" '
+        f'transform="rotate(-90 15 {(top + bottom) / 2})">{escape(value_label)}</text>',
+        f'<text x="{left}" y="{bottom + 18}" text-anchor="middle">0</text>',
+        f'<text x="{right}" y="{bottom + 18}" text-anchor="middle">{length:g}</text>',
+        f'<text x="{left - 5}" y="{bottom}" text-anchor="end">{y_min:.3g}</text>',
+        f'<text x="{left - 5}" y="{top + 10}" text-anchor="end">{y_max:.3g}</text>',
+        f'<polyline fill="none" stroke="#1f77b4" stroke-width="2" points="{curves[0]}">{animation}</polyline>',
+        '</svg>',
+    ]
+    return "\n".join(parts).encode()
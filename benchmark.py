@@ -0,0 +1,486 @@
+"""
+FusionSim Benchmarks
+--------------------
+Latency, throughput and memory benchmarks for the solver, the renderer and
+the API, with a compare mode that flags regressions against a saved baseline.
+
+Five groups of cases are measured:
+1. "simulation": run_simulation for each simulation type over a grid of nx and steps
+2. "render": _generate_animation for several frame counts, for large nx
+   (whose curves are decimated before drawing), and in preview mode
+3. "encode": _generate_animation in every available animation format for
+   several frame counts, recording the size of the output
+4. "endpoint": POST /diffusion end to end through a test client, with the
+   result cache cleared before every request
+5. "scaling": the parallel backend on a large grid for a growing number of
+   processes, at a fixed nx (strong scaling) and at a fixed nx per process
+   (weak scaling), against the serial NumPy backend as the 1-process case.
+   These cases also report the speedup over that case and the parallel
+   efficiency (speedup / processes).
+
+Each case is run once to warm up and then timed repeatedly. The report is a
+JSON document with, per case, the p50/p99/mean latency, the throughput and
+the peak resident memory of the benchmark process while the case ran
+(simulations behind the endpoint run in worker processes, which are not
+included).
+
+Usage:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+    python benchmark.py --compare baseline.json --current other.json --threshold 0.3
+    python benchmark.py --groups scaling --output scaling.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from diffusion_simulation import run_simulation
+
+# Version of the JSON report layout
+REPORT_VERSION = 1
+
+# Benchmark groups, in the order they run
+GROUPS = ("simulation", "render", "encode", "endpoint", "scaling")
+
+# Default relative slowdown (or memory growth) counted as a regression
+REGRESSION_THRESHOLD = 0.2
+
+# Coefficients used for every simulation case
+SIMULATION_TYPES = {
+    "diffusion": {"D": 1.0},
+    "heat": {"k": 1.0},
+    "advection_diffusion": {"D": 1.0, "velocity": 1.0},
+}
+
+# Case grids: (nx values, steps values, repeats) for simulations, frame counts for rendering
+FULL_GRID = {
+    "nx": (100, 1000), "steps": (100, 1000), "frames": (10, 20, 50, 200), "render_nx": (10_000, 1_000_000), "repeat": 5
+}
+QUICK_GRID = {"nx": (100,), "steps": (100,), "frames": (10,), "render_nx": (10_000,), "repeat": 3}
+
+# Scaling cases: nx of the strong scaling runs, nx per process of the weak scaling runs, and steps
+FULL_SCALING = {"nx": 4_000_000, "nx_per_worker": 1_000_000, "steps": 50}
+QUICK_SCALING = {"nx": 400_000, "nx_per_worker": 100_000, "steps": 10}
+
+
+def measure(
+    name: str,
+    group: str,
+    func: Callable[[], Any],
+    repeat: int,
+    work: float = 1.0,
+    unit: str = "runs",
+    params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Time repeated calls of a function and summarize them.
+
+    Args:
+        name: Unique name of the case, used to match it against a baseline
+        group: Benchmark group of the case
+        func: Function to call; one untimed call warms it up
+        repeat: Number of timed calls
+        work: Units of work done by one call, e.g. cell steps or frames
+        unit: Name of the unit of work, reported with the throughput
+        params: Parameters of the case, recorded in the report
+
+    Returns:
+        Result entry of the report
+    """
+    func()
+    _reset_peak_rss()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    return {
+        "name": name,
+        "group": group,
+        "params": params or {},
+        "runs": repeat,
+        "latency_s": {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p99": float(np.percentile(latencies, 99)),
+            "min": float(latencies.min()),
+            "max": float(latencies.max()),
+        },
+        "throughput": {"value": float(work * repeat / latencies.sum()), "unit": f"{unit}/s"},
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+
+
+def simulation_cases(grid: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any], Callable[[], Any], float, str]]:
+    """Yield the run_simulation cases: one per simulation type, nx and steps."""
+    for simulation_type, coefficients in SIMULATION_TYPES.items():
+        for nx in grid["nx"]:
+            for steps in grid["steps"]:
+                params = {"simulation_type": simulation_type, "nx": nx, "steps": steps, "dt": 0.1,
+                          "store_steps": 20, **coefficients}
+                yield (
+                    f"simulation/{simulation_type}/nx={nx}/steps={steps}",
+                    params,
+                    lambda params=params: run_simulation(**params),
+                    float(nx * steps),
+                    "cell-steps"
+                )
+
+
+def render_cases(grid: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any], Callable[[], Any], float, str]]:
+    """Yield the _generate_animation cases: per frame count, per large nx and in preview mode, on precomputed results."""
+    main = _load_app()
+    nx = 200
+    for frames in grid["frames"]:
+        request = main.SimulationParams(simulation_type="diffusion", nx=nx, store_frames=frames)
+        results = run_simulation("diffusion", nx=nx, D=1.0, steps=100, store_steps=frames)
+        yield (
+            f"render/frames={len(results)}",
+            {"nx": nx, "frames": len(results)},
+            lambda request=request, results=results: main._generate_animation(request, results),
+            float(len(results)),
+            "frames"
+        )
+
+    # Render time should not depend on nx, whose curves are decimated to the plot width
+    frames = grid["frames"][0]
+    for large_nx in grid["render_nx"]:
+        request = main.SimulationParams(simulation_type="diffusion", nx=large_nx, store_frames=frames)
+        results = run_simulation("diffusion", nx=large_nx, D=1.0, steps=100, store_steps=frames, backend="numpy")
+        yield (
+            f"render/nx={large_nx}/frames={len(results)}",
+            {"nx": large_nx, "frames": len(results)},
+            lambda request=request, results=results: main._generate_animation(request, results),
+            float(len(results)),
+            "frames"
+        )
+
+    request = main.SimulationParams(simulation_type="diffusion", nx=nx, store_frames=frames)
+    results = run_simulation("diffusion", nx=nx, D=1.0, steps=100, store_steps=frames)
+    yield (
+        f"render/preview/frames={len(results)}",
+        {"nx": nx, "frames": len(results), "preview": True},
+        lambda request=request, results=results: main._generate_animation(request, results, preview=True),
+        float(len(results)),
+        "frames"
+    )
+
+
+def encode_cases(grid: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any], Callable[[], Any], float, str]]:
+    """Yield the animation format cases: one per available format and frame count, recording the output size."""
+    main = _load_app()
+    from animation_formats import available_formats
+
+    nx = 200
+    for frames in grid["frames"]:
+        request = main.SimulationParams(simulation_type="diffusion", nx=nx, store_frames=frames)
+        results = run_simulation("diffusion", nx=nx, D=1.0, steps=frames * 5, store_steps=frames)
+        for fmt in available_formats():
+            output = main._generate_animation(request, results, fmt=fmt)
+            yield (
+                f"encode/{fmt}/frames={len(results)}",
+                {"format": fmt, "nx": nx, "frames": len(results), "bytes": len(output)},
+                lambda request=request, results=results, fmt=fmt: main._generate_animation(request, results, fmt=fmt),
+                float(len(results)),
+                "frames"
+            )
+
+
+def endpoint_cases(grid: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any], Callable[[], Any], float, str]]:
+    """Yield the POST /diffusion cases: one per simulation type, each request computed from scratch."""
+    main = _load_app()
+    from fastapi.testclient import TestClient
+
+    client = TestClient(main.app)
+    client.__enter__()
+    try:
+        for simulation_type, coefficients in SIMULATION_TYPES.items():
+            body = {"simulation_type": simulation_type, "nx": 100, "steps": 100, "store_frames": 20, **coefficients}
+
+            def post(body: Dict[str, Any] = body) -> None:
+                main.result_cache.clear()
+                response = client.post("/diffusion", json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/diffusion returned {response.status_code}: {response.text}")
+
+            yield f"endpoint/diffusion/{simulation_type}", body, post, 1.0, "requests"
+    finally:
+        client.__exit__(None, None, None)
+
+
+def scaling_cases(grid: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any], Callable[[], Any], float, str]]:
+    """Yield the parallel backend cases: strong and weak scaling over powers of two up to the CPU count."""
+    scaling = QUICK_SCALING if grid is QUICK_GRID else FULL_SCALING
+    cpus = os.cpu_count() or 1
+    worker_counts = [1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus]
+    if worker_counts[-1] != cpus:
+        worker_counts.append(cpus)
+
+    for mode in ("strong", "weak"):
+        for workers in worker_counts:
+            nx = scaling["nx"] if mode == "strong" else scaling["nx_per_worker"] * workers
+            # One process is the serial path the parallel backend is measured against
+            backend = "numpy" if workers == 1 else "parallel"
+            params = {"simulation_type": "diffusion", "nx": nx, "steps": scaling["steps"], "dt": 0.1,
+                      "store_steps": 5, "D": 1.0, "backend": backend, "workers": workers}
+            yield (
+                f"scaling/{mode}/workers={workers}",
+                {**params, "mode": mode},
+                lambda params=params: run_simulation(**params),
+                float(nx * scaling["steps"]),
+                "cell-steps"
+            )
+
+
+def add_scaling_efficiency(results: List[Dict[str, Any]]) -> None:
+    """
+    Add the speedup and parallel efficiency of each scaling case, relative to the 1-process case.
+
+    The speedup is the ratio of throughputs, so it applies to strong scaling
+    (same work) and weak scaling (work growing with the processes) alike.
+    """
+    serial = {
+        result["params"]["mode"]: result["throughput"]["value"]
+        for result in results
+        if result["group"] == "scaling" and result["params"]["workers"] == 1
+    }
+    for result in results:
+        if result["group"] != "scaling" or result["params"]["mode"] not in serial:
+            continue
+        speedup = result["throughput"]["value"] / serial[result["params"]["mode"]]
+        result["scaling"] = {"speedup": speedup, "efficiency": speedup / result["params"]["workers"]}
+
+
+def run_benchmarks(groups: Iterable[str] = GROUPS, quick: bool = False) -> Dict[str, Any]:
+    """
+    Run the selected benchmark groups.
+
+    Args:
+        groups: Names of the groups to run
+        quick: Use a small grid and fewer repeats, e.g. for a smoke test
+
+    Returns:
+        The report, ready to be written as JSON
+
+    Raises:
+        ValueError: If a group is unknown
+    """
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown benchmark groups: {sorted(unknown)}")
+
+    grid = QUICK_GRID if quick else FULL_GRID
+    case_builders = {
+        "simulation": simulation_cases, "render": render_cases, "encode": encode_cases, "endpoint": endpoint_cases,
+        "scaling": scaling_cases
+    }
+    results = []
+    for group in GROUPS:
+        if group not in groups:
+            continue
+        for name, params, func, work, unit in case_builders[group](grid):
+            result = measure(name, group, func, grid["repeat"], work=work, unit=unit, params=params)
+            results.append(result)
+            if group == "scaling":
+                add_scaling_efficiency(results)
+            print(_format_result(result), file=sys.stderr)
+
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "quick": quick,
+        "environment": _environment(),
+        "results": results,
+    }
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = REGRESSION_THRESHOLD
+) -> Dict[str, Any]:
+    """
+    Compare two reports case by case.
+
+    A case regresses when its p50 latency or its peak RSS grows by more than
+    threshold relative to the baseline. Cases present in only one report are
+    listed but never count as regressions.
+
+    Args:
+        baseline: Report to compare against
+        current: Report to check
+        threshold: Largest accepted relative growth, e.g. 0.2 for 20%
+
+    Returns:
+        Dictionary with the per-case comparisons, the names of regressed cases
+        and of unmatched cases
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    current_results = {result["name"]: result for result in current["results"]}
+
+    cases = []
+    for name, result in current_results.items():
+        reference = baseline_results.get(name)
+        if reference is None:
+            continue
+        ratios = {
+            "p50_latency": _ratio(result["latency_s"]["p50"], reference["latency_s"]["p50"]),
+            "peak_rss": _ratio(result["peak_rss_bytes"], reference["peak_rss_bytes"]),
+        }
+        regressed = [metric for metric, ratio in ratios.items() if ratio is not None and ratio > 1 + threshold]
+        cases.append({"name": name, "ratios": ratios, "regressed": regressed})
+
+    return {
+        "threshold": threshold,
+        "cases": cases,
+        "regressions": [case["name"] for case in cases if case["regressed"]],
+        "missing": sorted(set(baseline_results) - set(current_results)),
+        "new": sorted(set(current_results) - set(baseline_results)),
+    }
+
+
+def _ratio(value: Optional[float], reference: Optional[float]) -> Optional[float]:
+    """Return value / reference, or None when either is unknown or the reference is zero."""
+    if value is None or not reference:
+        return None
+    return value / reference
+
+
+def _load_app() -> Any:
+    """Import the API server with its job store in a temporary directory."""
+    if "main" not in sys.modules:
+        # Keep the benchmark away from the real job store
+        os.environ["FUSIONSIM_JOBS_DIR"] = tempfile.mkdtemp(prefix="fusionsim_bench_jobs_")
+    import main
+    return main
+
+
+def _reset_peak_rss() -> None:
+    """Reset the kernel's peak RSS counter of this process, where supported (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """
+    Return the peak resident memory of this process.
+
+    Uses VmHWM, which _reset_peak_rss() resets between cases, and falls back to
+    the lifetime peak from getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _environment() -> Dict[str, Any]:
+    """Describe the interpreter, machine and library versions the report was made with."""
+    versions = {}
+    for package in ("numpy", "scipy", "fipy", "matplotlib", "fastapi"):
+        try:
+            versions[package] = __import__(package).__version__
+        except Exception:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def _format_result(result: Dict[str, Any]) -> str:
+    """Format one result entry as a line of the summary table."""
+    latency = result["latency_s"]
+    rss = result["peak_rss_bytes"]
+    line = (
+        f"{result['name']:<50} p50 {latency['p50'] * 1000:9.2f} ms  p99 {latency['p99'] * 1000:9.2f} ms  "
+        f"{result['throughput']['value']:12.4g} {result['throughput']['unit']:<15} "
+        f"rss {rss / 2 ** 20 if rss else float('nan'):8.1f} MiB"
+    )
+    if "scaling" in result:
+        line += f"  speedup x{result['scaling']['speedup']:.2f}  efficiency {result['scaling']['efficiency']:.0%}"
+    return line
+
+
+def _format_comparison(comparison: Dict[str, Any]) -> str:
+    """Format a comparison as a table, listing regressions last."""
+    lines = []
+    for case in comparison["cases"]:
+        ratios = "  ".join(
+            f"{metric} {'n/a' if ratio is None else f'x{ratio:.2f}'}" for metric, ratio in case["ratios"].items()
+        )
+        flag = "REGRESSED " + ",".join(case["regressed"]) if case["regressed"] else "ok"
+        lines.append(f"{case['name']:<50} {ratios}  {flag}")
+    for name in comparison["missing"]:
+        lines.append(f"{name:<50} missing from the current report")
+    for name in comparison["new"]:
+        lines.append(f"{name:<50} not in the baseline")
+    lines.append(
+        f"{len(comparison['regressions'])} of {len(comparison['cases'])} cases regressed "
+        f"(threshold {comparison['threshold']:.0%})"
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns the exit status (1 when a comparison finds regressions)."""
+    parser = argparse.ArgumentParser(description="Benchmark FusionSim and compare against a baseline")
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS), help="Benchmark groups to run")
+    parser.add_argument("--quick", action="store_true", help="Run a small grid with fewer repeats")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a saved report and flag regressions")
+    parser.add_argument("--current", help="Report to compare instead of running the benchmarks")
+    parser.add_argument(
+        "--threshold", type=float, default=REGRESSION_THRESHOLD,
+        help=f"Relative growth counted as a regression (default {REGRESSION_THRESHOLD})"
+    )
+    args = parser.parse_args(argv)
+
+    if args.current:
+        with open(args.current) as f:
+            report = json.load(f)
+    else:
+        report = run_benchmarks(args.groups, quick=args.quick)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparison = compare_reports(baseline, report, threshold=args.threshold)
+        print(_format_comparison(comparison), file=sys.stderr)
+        report = {**report, "comparison": comparison}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    elif not args.current:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    return 1 if args.compare and report["comparison"]["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+FusionSim Checkpoints
+---------------------
+Snapshots of a simulation state that a later run can start from.
+
+A checkpoint is a compressed .npz file holding:
+- state: the values on the mesh, an array of shape (nx,), or (ny, nx) in 2D
+- time: the physical time of the state
+- step: the number of time steps the run that wrote it had taken
+- metadata: a JSON object with the parameters of the run that wrote it
+
+Files are written through a temporary file and renamed into place, so a
+reader never sees a partial checkpoint even if the writer is killed.
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+class Checkpoint:
+    """A simulation state at a given time."""
+
+    def __init__(self, state: np.ndarray, time: float, step: int, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            state: Values on the mesh
+            time: Physical time of the state
+            step: Number of time steps the writing run had taken to reach the state
+            metadata: Parameters of the run that produced the state
+        """
+        self.state = state
+        self.time = time
+        self.step = step
+        self.metadata = metadata or {}
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """
+    Write a checkpoint to a .npz file, replacing any previous one atomically.
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f,
+                state=np.asarray(checkpoint.state, dtype=np.float64),
+                time=np.float64(checkpoint.time),
+                step=np.int64(checkpoint.step),
+                metadata=np.array(json.dumps(checkpoint.metadata, default=str))
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    """
+    Read a checkpoint written by save_checkpoint.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a valid checkpoint
+    """
+    with np.load(path, allow_pickle=False) as data:
+        try:
+            return Checkpoint(
+                state=data["state"],
+                time=float(data["time"]),
+                step=int(data["step"]),
+                metadata=json.loads(str(data["metadata"]))
+            )
+        except KeyError as e:
+            raise ValueError(f"{path} is not a checkpoint, it has no {e} entry") from e
+
+
+def iter_checkpointed(
+    frames: Iterator[np.ndarray],
+    path: str,
+    every: int,
+    frame_steps: List[int],
+    start_time: float,
+    dt: float,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Iterator[np.ndarray]:
+    """
+    Pass stored timesteps through, writing a checkpoint every ``every`` frames.
+
+    The final frame is always checkpointed, so a finished run can be continued.
+
+    Args:
+        frames: Stored timesteps of a run, starting with its initial state
+        path: Checkpoint file, overwritten by each checkpoint
+        every: Number of stored frames between checkpoints
+        frame_steps: Time step reached at each stored frame
+        start_time: Physical time of the initial state
+        dt: Time step size
+        metadata: Parameters recorded in each checkpoint
+
+    Yields:
+        The frames, unchanged
+
+    Raises:
+        ValueError: If the interval is not positive
+    """
+    if every <= 0:
+        raise ValueError(f"Checkpoint interval must be positive, got {every}")
+
+    final_index = len(frame_steps) - 1
+    for index, (frame, step) in enumerate(zip(frames, frame_steps)):
+        if index > 0 and (index % every == 0 or index == final_index):
+            save_checkpoint(path, Checkpoint(frame, start_time + step * dt, step, metadata))
+        yield frame
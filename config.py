@@ -0,0 +1,105 @@
+"""
+FusionSim Configuration
+-----------------------
+Runtime settings for the FusionSim API server, read from environment variables.
+
+Every setting has a default that is suitable for local development, so the
+server can be started without any configuration.
+"""
+
+import os
+from typing import Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to a default."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {name} must be an integer, got {value!r}")
+
+
+def _env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Read a string setting from the environment, treating empty values as unset."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value
+
+
+# Worker pool: number of processes running simulations and rendering
+WORKER_PROCESSES = max(1, _env_int("FUSIONSIM_WORKERS", os.cpu_count() or 1))
+
+# Admission queue: requests allowed to wait for a free worker before we return 503
+WORKER_QUEUE_SIZE = max(0, _env_int("FUSIONSIM_QUEUE_SIZE", 2 * WORKER_PROCESSES))
+
+# Seconds suggested to clients in the Retry-After header when the queue is full
+RETRY_AFTER_SECONDS = max(1, _env_int("FUSIONSIM_RETRY_AFTER", 5))
+
+# Heavy requests and jobs (see rate_limit.py) cost at least HEAVY_REQUEST_COST cell updates
+HEAVY_REQUEST_COST = max(1, _env_int("FUSIONSIM_HEAVY_COST", 50_000_000))
+
+# Rate limiting, in cell updates: the largest cost of a single request and of a single job,
+# and the refill rate per second and capacity of each client's token bucket, which interactive
+# requests and jobs share. 0 disables the budget or the buckets.
+MAX_REQUEST_COST = max(0, _env_int("FUSIONSIM_MAX_REQUEST_COST", 10_000_000_000))
+JOB_MAX_COST = max(0, _env_int("FUSIONSIM_JOB_MAX_COST", 1_000_000_000_000))
+CLIENT_RATE = max(0, _env_int("FUSIONSIM_CLIENT_RATE", 200_000_000))
+CLIENT_BURST = max(0, _env_int("FUSIONSIM_CLIENT_BURST", 10_000_000_000))
+
+# Header identifying the client for rate limiting, e.g. X-Forwarded-For behind a proxy;
+# the address of the connecting peer is used when unset
+CLIENT_HEADER = _env_str("FUSIONSIM_CLIENT_HEADER")
+
+# Result cache: memory tier size in bytes, and an optional directory for the disk tier
+CACHE_MAX_BYTES = max(0, _env_int("FUSIONSIM_CACHE_BYTES", 256 * 1024 * 1024))
+CACHE_DIR = _env_str("FUSIONSIM_CACHE_DIR")
+
+# Job queue: directory of the persistent job store, and how many jobs run at once.
+# Jobs leave the remaining worker slots to interactive requests.
+JOBS_DIR = _env_str("FUSIONSIM_JOBS_DIR", "fusionsim_jobs")
+JOB_CONCURRENCY = max(1, min(_env_int("FUSIONSIM_JOB_CONCURRENCY", WORKER_PROCESSES // 2), WORKER_PROCESSES - 1))
+
+# At most HEAVY_SLOTS heavy requests and heavy jobs are admitted at once. Light jobs hold a
+# worker too, so HEAVY_SLOTS + JOB_CONCURRENCY is capped at WORKER_PROCESSES - 1 to keep one
+# worker free for light interactive requests. With one or two workers that is impossible, as
+# both need at least one slot; heavy work can then take every worker, and a warning is logged
+# at startup.
+HEAVY_SLOTS = max(1, min(
+    _env_int("FUSIONSIM_HEAVY_SLOTS", WORKER_PROCESSES - 1), WORKER_PROCESSES - 1 - JOB_CONCURRENCY
+))
+
+# Processes a simulation on the parallel backend splits its grid across. Parallel runs always
+# take a heavy slot, so by default the CPU cores but one are shared out among the heavy slots.
+PARALLEL_WORKERS = max(1, _env_int("FUSIONSIM_PARALLEL_WORKERS", ((os.cpu_count() or 1) - 1) // HEAVY_SLOTS))
+
+# Per-job limits: wall-clock seconds, and the size in bytes of the stored results, checked
+# before the results file is allocated. It does not bound the solver's working memory
+JOB_TIME_LIMIT = max(1, _env_int("FUSIONSIM_JOB_TIME_LIMIT", 3600))
+JOB_MAX_RESULT_BYTES = max(1, _env_int("FUSIONSIM_JOB_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Logging: level, "text" or "json" lines, and the log file, rotated at LOG_MAX_BYTES
+# with LOG_BACKUPS old files kept. Set FUSIONSIM_LOG_FILE to "none" to log to stdout only.
+LOG_LEVEL = _env_str("FUSIONSIM_LOG_LEVEL", "INFO")
+LOG_FORMAT = _env_str("FUSIONSIM_LOG_FORMAT", "text")
+LOG_FILE = _env_str("FUSIONSIM_LOG_FILE", "server_log.txt")
+if LOG_FILE.lower() == "none":
+    LOG_FILE = None
+LOG_MAX_BYTES = max(1, _env_int("FUSIONSIM_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUPS = max(0, _env_int("FUSIONSIM_LOG_BACKUPS", 5))
+
+# Warm-up: start the workers at boot and have each import FiPy and matplotlib and run
+# a tiny solve and render; the health check reports ready once they are done or after
+# WARMUP_TIMEOUT seconds. Disable to start workers on the first request instead.
+WARMUP = _env_int("FUSIONSIM_WARMUP", 1) > 0
+WARMUP_TIMEOUT = max(1, _env_int("FUSIONSIM_WARMUP_TIMEOUT", 120))
+
+# Profiling: disabled unless a token is set. A request sending the token in the
+# X-FusionSim-Profile header is run under the sampling profiler, and its profile
+# is stored in PROFILES_DIR. The sampling interval is in milliseconds.
+PROFILE_TOKEN = _env_str("FUSIONSIM_PROFILE_TOKEN")
+PROFILES_DIR = _env_str("FUSIONSIM_PROFILES_DIR", "fusionsim_profiles")
+PROFILE_INTERVAL_MS = max(1, _env_int("FUSIONSIM_PROFILE_INTERVAL_MS", 2))
@@ -0,0 +1,125 @@
+"""
+FusionSim Frame Buffer
+----------------------
+Preallocated storage for the timesteps stored by a simulation run.
+
+Frames are written into one contiguous (n_frames, *frame shape) array as the solver
+produces them, instead of being collected in a list and stacked afterwards,
+so a run never holds its results twice. The buffer can use float32 to halve
+its size, or be backed by a memory-mapped .npy file for runs that do not
+fit in memory. The minimum and maximum over all written frames are tracked
+as frames arrive, so plotting does not need another pass over the data.
+"""
+
+import math
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+
+class FrameBuffer:
+    """A fixed-size array of frames filled in order."""
+
+    def __init__(
+        self,
+        n_frames: int,
+        frame_shape: Union[int, Tuple[int, ...]],
+        dtype: np.dtype = np.float64,
+        path: Optional[str] = None
+    ):
+        """
+        Args:
+            n_frames: Number of frames the buffer can hold
+            frame_shape: Shape of each frame, e.g. nx for a 1D mesh or (ny, nx) for a 2D one
+            dtype: Data type of the stored values, e.g. float64 or float32
+            path: File of a memory-mapped .npy array to write into, or None to keep it in memory
+
+        Raises:
+            ValueError: If the shape is invalid
+        """
+        shape = (n_frames,) + tuple(np.atleast_1d(frame_shape).tolist())
+        if min(shape) <= 0:
+            raise ValueError(f"Frame buffer shape must be positive, got {shape}")
+
+        if path is None:
+            self._data = np.empty(shape, dtype=dtype)
+        else:
+            self._data = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.path = path
+        self._count = 0
+        self._min = math.inf
+        self._max = -math.inf
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Iterable[np.ndarray],
+        n_frames: int,
+        dtype: np.dtype = np.float64,
+        path: Optional[str] = None
+    ) -> "FrameBuffer":
+        """
+        Fill a new buffer from an iterable of frames.
+
+        The frame shape is taken from the first frame, so callers only need to
+        know how many frames to expect.
+
+        Raises:
+            ValueError: If the iterable is empty or yields more than n_frames frames
+        """
+        buffer = None
+        for frame in frames:
+            if buffer is None:
+                buffer = cls(n_frames, np.shape(frame), dtype=dtype, path=path)
+            buffer.append(frame)
+        if buffer is None:
+            raise ValueError("Cannot build a frame buffer from no frames")
+        buffer.flush()
+        return buffer
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        """Number of frames the buffer can hold."""
+        return self._data.shape[0]
+
+    @property
+    def values(self) -> np.ndarray:
+        """The frames written so far, as an (n_written, *frame shape) view."""
+        return self._data[:self._count]
+
+    @property
+    def min(self) -> float:
+        """Smallest value written so far, ignoring NaNs."""
+        return self._min
+
+    @property
+    def max(self) -> float:
+        """Largest value written so far, ignoring NaNs."""
+        return self._max
+
+    def append(self, frame: np.ndarray) -> None:
+        """
+        Copy a frame into the next free row.
+
+        Raises:
+            ValueError: If the buffer is full or the frame has the wrong shape
+        """
+        if self._count == self.capacity:
+            raise ValueError(f"Frame buffer is full ({self.capacity} frames)")
+
+        row = self._data[self._count]
+        row[:] = frame
+        self._count += 1
+
+        # Update the running limits from the stored row (NaNs from a diverged run are skipped)
+        if row.size:
+            self._min = min(self._min, float(np.nanmin(row, initial=math.inf)))
+            self._max = max(self._max, float(np.nanmax(row, initial=-math.inf)))
+
+    def flush(self) -> None:
+        """Write a memory-mapped buffer back to its file."""
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
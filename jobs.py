@@ -0,0 +1,522 @@
+"""
+FusionSim Job Queue
+-------------------
+Runs long simulations as background jobs, so clients poll for progress
+instead of holding an HTTP connection open for the whole run.
+
+A job goes through the states queued -> running -> completed, or ends as
+failed or cancelled. While it runs, its stored timesteps are streamed into a
+memory-mapped results file, which gives per-frame progress. The simulation
+runs in a process of its own under a worker pool slot, so a cancellation or
+the time limit terminates it at once, and the slot is only released once the
+process has exited. Once the run finishes, the animation is rendered on the
+worker pool and saved next to it.
+
+Every job lives in its own directory of the job store:
+- job.json: the job record (parameters, status, timestamps, error)
+- results.npy: the stored timesteps, an array of shape (frames, nx), or (frames, ny, nx) in 2D
+- animation.gif: the rendered animation
+- checkpoint.npz: the state of the latest stored timestep (see checkpoints.py)
+
+A completed job can be continued for more steps: the new job starts from
+the final checkpoint of its parent instead of the initial condition, so
+only the additional steps are computed.
+
+Records are rewritten on every status change, so completed jobs survive a
+restart; jobs that were queued or running when the server stopped are
+queued again.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from checkpoints import load_checkpoint
+from frame_buffer import FrameBuffer
+from numpy_backend import stored_frame_count
+from worker_pool import PoolSaturatedError, WorkerPool
+
+logger = logging.getLogger("fusionsim")
+
+# Type alias for job states
+JobStatus = Literal["queued", "running", "completed", "failed", "cancelled"]
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+RECORD_FILE = "job.json"
+RESULTS_FILE = "results.npy"
+ANIMATION_FILE = "animation.gif"
+CHECKPOINT_FILE = "checkpoint.npz"
+
+
+class JobNotFoundError(KeyError):
+    """Raised when a job id is not in the store."""
+
+
+class JobLimitError(ValueError):
+    """Raised when a job would exceed the per-job limits."""
+
+
+class JobStateError(RuntimeError):
+    """Raised when a job is not in a state that allows the requested operation."""
+
+
+class Job:
+    """The record of one background simulation."""
+
+    def __init__(
+        self,
+        job_id: str,
+        request: Dict[str, Any],
+        simulation: Dict[str, Any],
+        status: JobStatus = "queued",
+        created_at: Optional[float] = None,
+        started_at: Optional[float] = None,
+        finished_at: Optional[float] = None,
+        error: Optional[str] = None,
+        parent: Optional[str] = None,
+        heavy: bool = False
+    ):
+        """
+        Args:
+            job_id: Unique id of the job
+            request: The request as submitted, passed to the renderer
+            simulation: Keyword arguments of the simulation function
+            status: Current state of the job
+            created_at: Submission time, as a Unix timestamp
+            started_at: Time the job started running
+            finished_at: Time the job reached a final state
+            error: Reason the job failed, if it did
+            parent: Id of the job this one continues from, if any
+            heavy: Whether the job takes one of the heavy slots of the worker pool
+        """
+        self.id = job_id
+        self.request = request
+        self.simulation = simulation
+        self.status = status
+        self.created_at = created_at if created_at is not None else time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.error = error
+        self.parent = parent
+        self.heavy = heavy
+        self.frames_done = 0
+        self.cancel_requested = False
+
+    @property
+    def frames_total(self) -> int:
+        """Number of timesteps the run will store."""
+        return stored_frame_count(self.simulation["steps"], self.simulation["store_steps"])
+
+    @property
+    def result_bytes(self) -> int:
+        """Size in bytes of the results array the run will store, in float64."""
+        cells = self.simulation["nx"] * (self.simulation.get("ny") or 1)
+        return self.frames_total * cells * np.dtype(np.float64).itemsize
+
+    @property
+    def step(self) -> int:
+        """Time step reached by the run, as of its last stored frame."""
+        if self.status == "completed":
+            return self.simulation["steps"]
+        if self.frames_done <= 1:
+            return 0
+        save_frequency = max(1, self.simulation["steps"] // self.simulation["store_steps"])
+        return min(self.simulation["steps"], (self.frames_done - 1) * save_frequency)
+
+    @property
+    def start_time(self) -> float:
+        """Physical time at which the run starts."""
+        return self.simulation.get("start_time", 0.0)
+
+    @property
+    def end_time(self) -> float:
+        """Physical time reached by the run once it completes."""
+        return self.start_time + self.simulation["steps"] * self.simulation["dt"]
+
+    def to_record(self) -> Dict[str, Any]:
+        """Return the persistent part of the job as a JSON-serializable dict."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "parent": self.parent,
+            "heavy": self.heavy,
+            "request": self.request,
+            "simulation": self.simulation
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Job":
+        """Rebuild a job from a dict written by to_record."""
+        return cls(
+            record["id"],
+            request=record["request"],
+            simulation=record["simulation"],
+            status=record["status"],
+            created_at=record["created_at"],
+            started_at=record["started_at"],
+            finished_at=record["finished_at"],
+            error=record["error"],
+            parent=record.get("parent"),
+            heavy=record.get("heavy", False)
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        """Return the status report of the job."""
+        steps = self.simulation["steps"]
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": {
+                "step": self.step,
+                "steps": steps,
+                "fraction": self.step / steps if steps else 1.0
+            },
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "parent": self.parent,
+            "start_time": self.start_time,
+            "request": self.request
+        }
+
+
+class JobManager:
+    """
+    Queues jobs and runs them on a worker pool.
+
+    Jobs hold a worker pool slot while running, and at most ``concurrency``
+    jobs run at once; heavy jobs also take a heavy slot. A job that finds the
+    pool saturated stays queued until a slot frees up, instead of failing.
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        directory: str,
+        simulate: Callable[..., Iterator[np.ndarray]],
+        render: Callable[[Dict[str, Any], np.ndarray, Tuple[float, float]], bytes],
+        concurrency: int = 1,
+        time_limit: float = 3600,
+        max_result_bytes: int = 2 * 1024 * 1024 * 1024,
+        checkpoint_every: int = 1
+    ):
+        """
+        Args:
+            pool: Worker pool the simulations and rendering run on
+            directory: Directory of the job store
+            simulate: Picklable generator function yielding the stored timesteps; it must
+                accept initial_state, checkpoint_path and checkpoint_every
+            render: Picklable function rendering (request, results, limits) to a GIF
+            concurrency: Number of jobs running at once
+            time_limit: Wall-clock seconds a job may run before it is stopped
+            max_result_bytes: Largest results array a job may store, in bytes, checked on
+                submission and again before the results file is allocated. The solver's
+                own working memory is not counted
+            checkpoint_every: Number of stored timesteps between checkpoints of a running job
+        """
+        if concurrency <= 0:
+            raise ValueError(f"concurrency must be positive, got {concurrency}")
+
+        self.pool = pool
+        self.directory = directory
+        self.simulate = simulate
+        self.render = render
+        self.concurrency = concurrency
+        self.time_limit = time_limit
+        self.max_result_bytes = max_result_bytes
+        self.checkpoint_every = checkpoint_every
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, "asyncio.Task[None]"] = {}
+        self._queue: Optional["asyncio.Queue[str]"] = None
+        self._runners: List["asyncio.Task[None]"] = []
+
+    async def start(self) -> None:
+        """Load the job store and start the runners."""
+        self._queue = asyncio.Queue()
+        os.makedirs(self.directory, exist_ok=True)
+        for job in await asyncio.to_thread(self._load_records):
+            self._jobs[job.id] = job
+            if job.status not in FINISHED_STATUSES:
+                # The server stopped before the job finished; run it again from the start
+                logger.info("Requeueing interrupted job %s", job.id)
+                job.status = "queued"
+                job.started_at = None
+                self._queue.put_nowait(job.id)
+        self._runners = [asyncio.create_task(self._run_jobs()) for _ in range(self.concurrency)]
+        logger.info("Job manager started with %s stored jobs", len(self._jobs))
+
+    async def stop(self) -> None:
+        """Stop the runners. Running jobs are left to be requeued on the next start."""
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+
+    async def submit(
+        self,
+        request: Dict[str, Any],
+        simulation: Dict[str, Any],
+        parent: Optional[str] = None,
+        heavy: bool = False,
+        charge: Optional[Callable[[], None]] = None
+    ) -> Job:
+        """
+        Queue a new job.
+
+        Args:
+            request: The request as submitted, passed to the renderer
+            simulation: Keyword arguments of the simulation function; must include
+                nx, dt, steps and store_steps
+            parent: Id of a completed job whose final state the new job starts from
+            heavy: Whether the job takes one of the heavy slots of the worker pool
+            charge: Called once the job is within the job limits, before it is queued,
+                e.g. to charge a rate limiter; an exception it raises rejects the job
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobLimitError: If the results of the job would exceed max_result_bytes
+        """
+        job = Job(uuid.uuid4().hex, request=request, simulation=simulation, parent=parent, heavy=heavy)
+        self._check_result_size(job.result_bytes)
+        if charge is not None:
+            charge()
+
+        await self._save(job)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+        logger.info("Queued job %s", job.id)
+        return job
+
+    async def continue_job(
+        self,
+        job_id: str,
+        steps: int,
+        store_steps: Optional[int] = None,
+        heavy: bool = False,
+        charge: Optional[Callable[[], None]] = None
+    ) -> Job:
+        """
+        Queue a job that continues a completed job for more steps.
+
+        The new job starts from the final checkpoint of the completed one, at
+        the time where it ended, with the same parameters otherwise.
+
+        Args:
+            job_id: Id of the completed job to continue
+            steps: Number of additional time steps
+            store_steps: Number of timesteps to store, defaults to that of the parent
+            heavy, charge: As for submit
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobNotFoundError: If there is no job with this id
+            JobStateError: If the job has not completed or has no checkpoint
+            JobLimitError: If the results of the new job would exceed max_result_bytes
+        """
+        parent = self.get(job_id)
+        if parent.status != "completed":
+            raise JobStateError(f"Job {job_id} is {parent.status}, only completed jobs can be continued")
+        if not os.path.exists(self.result_path(parent, CHECKPOINT_FILE)):
+            raise JobStateError(f"Job {job_id} has no checkpoint to continue from")
+
+        store_steps = store_steps or parent.simulation["store_steps"]
+        simulation = {
+            **parent.simulation, "steps": steps, "store_steps": store_steps, "start_time": parent.end_time
+        }
+        request = {**parent.request, "steps": steps, "store_frames": store_steps}
+        return await self.submit(request, simulation, parent=parent.id, heavy=heavy, charge=charge)
+
+    def get(self, job_id: str) -> Job:
+        """
+        Look up a job.
+
+        Raises:
+            JobNotFoundError: If there is no job with this id
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(job_id)
+        return job
+
+    def list(self) -> List[Job]:
+        """Return all jobs, oldest first."""
+        return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    async def cancel(self, job_id: str) -> Job:
+        """
+        Cancel a queued or running job. Finished jobs are left unchanged.
+
+        Raises:
+            JobNotFoundError: If there is no job with this id
+        """
+        job = self.get(job_id)
+        if job.status in FINISHED_STATUSES:
+            return job
+
+        job.cancel_requested = True
+        task = self._tasks.get(job_id)
+        if task is not None:
+            # The job records its cancellation once the worker has stopped
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        else:
+            await self._finish(job, "cancelled")
+        return job
+
+    def result_path(self, job: Job, name: str) -> str:
+        """Return the path of a file in the directory of a job."""
+        return os.path.join(self.directory, job.id, name)
+
+    async def _run_jobs(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue
+
+            reservation = await self._reserve(job.heavy)
+            if job.status != "queued":
+                # Cancelled while waiting for a slot
+                reservation.release()
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._tasks[job.id] = task
+            try:
+                # Unlike wait_for, wait tells a cancelled job apart from a cancelled runner
+                done, _ = await asyncio.wait({task}, timeout=self.time_limit)
+                if not done:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    await self._finish(job, "failed", f"Time limit of {self.time_limit}s exceeded")
+                elif not task.cancelled() and task.exception() is not None:
+                    logger.error("Job %s failed: %s", job.id, task.exception())
+                    await self._finish(job, "failed", str(task.exception()))
+            except asyncio.CancelledError:
+                # The manager is stopping; leave the job to be requeued
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                # The task only ends once the simulation process has exited
+                self._tasks.pop(job.id, None)
+                reservation.release()
+
+    async def _reserve(self, heavy: bool) -> Any:
+        # Wait for a free slot without taking away the immediate 503 of interactive requests
+        while True:
+            try:
+                return self.pool.reserve(heavy=heavy)
+            except PoolSaturatedError as busy:
+                await asyncio.sleep(busy.retry_after)
+
+    async def _execute(self, job: Job) -> None:
+        try:
+            await self._run_job(job)
+        except asyncio.CancelledError:
+            if job.cancel_requested:
+                await self._finish(job, "cancelled")
+            raise
+
+    async def _run_job(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        job.frames_done = 0
+        await self._save(job)
+        logger.info("Running job %s", job.id)
+
+        simulation = {
+            **job.simulation,
+            "checkpoint_path": self.result_path(job, CHECKPOINT_FILE),
+            "checkpoint_every": self.checkpoint_every
+        }
+        if job.parent is not None:
+            # Start from the final state of the parent job
+            parent_checkpoint = self.result_path(self.get(job.parent), CHECKPOINT_FILE)
+            simulation["initial_state"] = (await asyncio.to_thread(load_checkpoint, parent_checkpoint)).state
+
+        # Stream the stored timesteps into the results file, counting them for progress
+        results_path = self.result_path(job, RESULTS_FILE)
+        buffer = None
+        frames = self.pool.stream_isolated(self.simulate, **simulation)
+        try:
+            async for frame in frames:
+                if buffer is None:
+                    # Checked again against the actual frames before the results file is allocated
+                    self._check_result_size(job.frames_total * frame.size * np.dtype(np.float64).itemsize)
+                    buffer = FrameBuffer(job.frames_total, frame.shape, path=results_path)
+                buffer.append(frame)
+                job.frames_done = len(buffer)
+        finally:
+            await frames.aclose()
+        buffer.flush()
+
+        logger.info("Rendering animation of job %s", job.id)
+        results = buffer.values
+        rendering = asyncio.ensure_future(self.pool.run(self.render, job.request, results, (buffer.min, buffer.max)))
+        try:
+            gif_bytes = await asyncio.shield(rendering)
+        except asyncio.CancelledError:
+            # A pool worker cannot be interrupted; keep the slot until it is done
+            await asyncio.gather(rendering, return_exceptions=True)
+            raise
+        await asyncio.to_thread(_write_atomic, self.result_path(job, ANIMATION_FILE), gif_bytes)
+        await self._finish(job, "completed")
+
+    def _check_result_size(self, result_bytes: int) -> None:
+        if result_bytes > self.max_result_bytes:
+            raise JobLimitError(
+                f"Job results would take {result_bytes} bytes, the limit is {self.max_result_bytes}"
+            )
+
+    async def _finish(self, job: Job, status: JobStatus, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        await self._save(job)
+        logger.info("Job %s %s", job.id, status)
+
+    async def _save(self, job: Job) -> None:
+        data = json.dumps(job.to_record(), indent=2).encode("utf-8")
+        await asyncio.to_thread(_write_atomic, self.result_path(job, RECORD_FILE), data)
+
+    def _load_records(self) -> List[Job]:
+        jobs = []
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry, RECORD_FILE)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    jobs.append(Job.from_record(json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Skipping unreadable job record %s: %s", path, e)
+        return jobs
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write a file through a temporary file so readers never see a partial one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,130 @@
+"""
+FusionSim Logging
+-----------------
+Non-blocking log handling for the API server.
+
+Log calls only put the record on a queue; a listener thread formats it and
+writes it to stdout and a size-limited, rotating log file. A slow disk or
+terminal therefore never stalls the event loop.
+
+The queue is a multiprocessing queue, so worker processes forked from the
+server send their records to the same listener instead of writing the file
+themselves.
+
+Records are written either as text lines or, for log collectors, as one JSON
+object per line ("json" format), including any fields passed with
+``extra=``.
+"""
+
+import atexit
+import json
+import logging
+import multiprocessing
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Literal, Optional
+
+# Type alias for log formats
+LogFormat = Literal["text", "json"]
+LOG_FORMATS = ("text", "json")
+
+# Layout of text log lines
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else on a record was passed with extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(
+    path: Optional[str],
+    level: str = "INFO",
+    max_bytes: int = 10 * 1024 * 1024,
+    backups: int = 5,
+    log_format: LogFormat = "text"
+) -> QueueListener:
+    """
+    Route all logging through a queue to a background listener.
+
+    Replaces the handlers of the root logger with a single QueueHandler. The
+    listener is stopped, flushing the queue, when the interpreter exits.
+
+    Args:
+        path: Log file, rotated when it reaches max_bytes; None logs to stdout only
+        level: Name of the lowest level logged, e.g. "INFO" or "DEBUG"
+        max_bytes: Size at which the log file is rotated
+        backups: Number of rotated files kept (path.1, path.2, ...)
+        log_format: "text" lines or one "json" object per line
+
+    Returns:
+        The started listener
+
+    Raises:
+        ValueError: If the level or format is unknown
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Invalid log format: {log_format}. Must be one of {', '.join(LOG_FORMATS)}")
+    numeric_level = logging.getLevelName(level.upper())
+    if not isinstance(numeric_level, int):
+        raise ValueError(f"Invalid log level: {level}")
+
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if path is not None:
+        handlers.append(RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Callers only merge the message and enqueue; formatting and I/O happen on the listener thread
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_RecordQueueHandler(log_queue))
+    root.setLevel(numeric_level)
+    return listener
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    A QueueHandler that keeps extra= fields and leaves formatting to the listener.
+
+    The base class formats the message with the handler's formatter before
+    enqueueing. Here only the message arguments are merged (they may not be
+    picklable) and the traceback is rendered to text, so records stay cheap
+    to enqueue and the listener's formatter decides the layout.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
@@ -6,44 +6,208 @@ Supports multiple simulation types including diffusion, heat equation, and advec
 """
 
 import os
-import sys
-import tempfile
+import json
+import time
+import asyncio
+import base64
+import secrets
 import traceback
 import logging
-from typing import Optional, Any, List, Dict, Union
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional, Any, AsyncIterator, Callable, Iterator, List, Dict, Tuple, Union
 from io import BytesIO
 
 # Third-party imports
 import numpy as np
-import imageio.v2 as imageio
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend
-import matplotlib.pyplot as plt
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import Response, StreamingResponse, JSONResponse, FileResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, field_validator, model_validator
 from enum import Enum
 
 # Local imports
-from diffusion_simulation import run_simulation
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("server_log.txt")
-    ]
+import config
+from analytic import analytic_deviation, check_applicable
+from diffusion_simulation import (
+    run_simulation, run_simulation_batch, run_simulation_with_limits, iter_simulation, default_engine,
+    check_options
+)
+from numpy_backend import stored_frame_count
+from parallel_backend import block_count
+from problems import get_problem
+from result_cache import ResultCache, make_key
+from result_formats import downsample, encode_results
+from animation_formats import (
+    ENVELOPE_RUNS_PER_PIXEL, FrameEncoder, MEDIA_TYPES, PREVIEW_DPI, RASTER_FORMATS, RENDER_DPI, available_formats, encode_json, encode_svg,
+    envelope_indices
+)
+from worker_pool import WorkerPool, PoolSaturatedError
+from rate_limit import CostLimitError, RateLimitedError, RateLimiter, estimate_cost
+from metrics import ANIMATION_BYTES, REGISTRY, Gauge, MetricsMiddleware, record_phase, timed
+from profiler import ProfileNotFoundError, list_profiles, load_profile, profile_call, save_profile, to_collapsed, to_speedscope
+from log_config import configure_logging
+from jobs import JobManager, JobNotFoundError, JobLimitError, JobStateError, RESULTS_FILE, ANIMATION_FILE
+
+# Configure logging: records are queued and written by a background thread (see log_config.py)
+configure_logging(
+    config.LOG_FILE,
+    level=config.LOG_LEVEL,
+    max_bytes=config.LOG_MAX_BYTES,
+    backups=config.LOG_BACKUPS,
+    log_format=config.LOG_FORMAT
 )
 logger = logging.getLogger("fusionsim")
 
+
+def _warm_up_worker() -> None:
+    """
+    Prepare a new worker process for its first request.
+    
+    Runs a tiny simulation and renders it, which imports FiPy, matplotlib and
+    imageio and fills their caches (FiPy's solver setup, matplotlib's fonts),
+    so the first real request runs at steady-state speed.
+    """
+    start = time.perf_counter()
+    params = SimulationParams(simulation_type="diffusion", nx=20, steps=2, store_frames=2)
+    results = run_simulation(params.simulation_type, store_steps=params.store_frames, **_prepare_simulation_params(params))
+    _generate_animation(params, results)
+    logger.info("Worker %s warmed up in %.2fs", os.getpid(), time.perf_counter() - start)
+
+
+# Worker pool for the blocking simulation and rendering work
+worker_pool = WorkerPool(
+    max_workers=config.WORKER_PROCESSES,
+    max_queue=config.WORKER_QUEUE_SIZE,
+    retry_after=config.RETRY_AFTER_SECONDS,
+    initializer=_warm_up_worker if config.WARMUP else None,
+    max_heavy=config.HEAVY_SLOTS
+)
+
+# Per-client token buckets and the per-request budget, weighted by estimated cost
+rate_limiter = RateLimiter(
+    rate=config.CLIENT_RATE,
+    burst=config.CLIENT_BURST,
+    max_cost=config.MAX_REQUEST_COST,
+    max_job_cost=config.JOB_MAX_COST
+)
+
+# Cache of simulation results and rendered animations, keyed on the request parameters
+result_cache = ResultCache(max_bytes=config.CACHE_MAX_BYTES, directory=config.CACHE_DIR)
+
+# Response header with the deviation of the numpy backend from an analytic run (?deviation=true)
+DEVIATION_HEADER = "X-FusionSim-Analytic-Deviation"
+
+
+def _render_job(request: Dict[str, Any], results: np.ndarray, limits: Tuple[float, float]) -> bytes:
+    """Render the animation of a finished job; runs in a worker process."""
+    return _generate_animation(SimulationParams(**request), results, limits)
+
+
+# Background jobs for long simulations, persisted in the job store
+job_manager = JobManager(
+    worker_pool,
+    directory=config.JOBS_DIR,
+    simulate=iter_simulation,
+    render=_render_job,
+    concurrency=config.JOB_CONCURRENCY,
+    time_limit=config.JOB_TIME_LIMIT,
+    max_result_bytes=config.JOB_MAX_RESULT_BYTES
+)
+
+
+def _pool_samples() -> List[Tuple[Dict[str, str], float]]:
+    """Admitted requests that are running on a worker and waiting for one."""
+    running = min(worker_pool.in_flight, worker_pool.max_workers)
+    return [({"state": "running"}, running), ({"state": "waiting"}, worker_pool.in_flight - running)]
+
+
+def _job_samples() -> List[Tuple[Dict[str, str], float]]:
+    """Number of jobs in each status."""
+    counts = {status: 0 for status in ("queued", "running", "completed", "failed", "cancelled")}
+    for job in job_manager.list():
+        counts[job.status] = counts.get(job.status, 0) + 1
+    return [({"status": status}, count) for status, count in counts.items()]
+
+
+def _cache_samples(field: str) -> Callable[[], List[Tuple[Dict[str, str], float]]]:
+    """Read one counter of every result cache namespace."""
+    def samples() -> List[Tuple[Dict[str, str], float]]:
+        namespaces = result_cache.stats()["namespaces"]
+        return [({"namespace": namespace}, counters[field]) for namespace, counters in namespaces.items()]
+    return samples
+
+
+# Gauges read from the worker pool, job queue and result cache on every scrape
+REGISTRY.register(Gauge("fusionsim_worker_requests", "Admitted requests by state", _pool_samples))
+REGISTRY.register(Gauge(
+    "fusionsim_worker_queue_capacity", "Requests the worker pool admits at once",
+    lambda: [({}, worker_pool.max_workers + worker_pool.max_queue)]
+))
+REGISTRY.register(Gauge("fusionsim_jobs", "Jobs by status", _job_samples))
+for field, help_text in (
+    ("hits", "Result cache lookups served from memory"),
+    ("disk_hits", "Result cache lookups served from disk"),
+    ("misses", "Result cache lookups that computed the value"),
+    ("coalesced", "Result cache lookups that waited for an identical request"),
+):
+    REGISTRY.register(Gauge(f"fusionsim_cache_{field}_total", help_text, _cache_samples(field), kind="counter"))
+REGISTRY.register(Gauge(
+    "fusionsim_cache_hit_ratio", "Share of result cache lookups that did not compute the value",
+    _cache_samples("hit_rate")
+))
+REGISTRY.register(Gauge("fusionsim_cache_bytes", "Memory used by the result cache", lambda: [({}, result_cache.stats()["bytes"])]))
+REGISTRY.register(Gauge(
+    "fusionsim_heavy_requests", "Admitted heavy requests, running or waiting", lambda: [({}, worker_pool.heavy_in_flight)]
+))
+REGISTRY.register(Gauge(
+    "fusionsim_rate_limited_total", "Requests rejected for their cost or their client's rate",
+    lambda: [({"reason": reason}, rate_limiter.stats()[f"rejected_{reason}"]) for reason in ("cost", "rate")],
+    kind="counter"
+))
+
+
+async def _warm_up(app: FastAPI) -> None:
+    """Start and warm up the worker processes, then mark the server ready."""
+    start = time.perf_counter()
+    if await worker_pool.start(timeout=config.WARMUP_TIMEOUT):
+        logger.info("Worker pool warmed up in %.2fs", time.perf_counter() - start)
+    else:
+        logger.warning("Worker pool not warmed up after %ss, serving anyway", config.WARMUP_TIMEOUT)
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the job queue and warm up the workers, and release the worker
+    processes when the server shuts down.
+    
+    The warm-up runs in the background so the health check can answer while
+    it runs; it reports ready once the warm-up is done.
+    """
+    if config.HEAVY_SLOTS + config.JOB_CONCURRENCY > config.WORKER_PROCESSES - 1:
+        logger.warning(
+            "%s worker processes cannot keep one free for light requests next to %s heavy slots and %s jobs",
+            config.WORKER_PROCESSES, config.HEAVY_SLOTS, config.JOB_CONCURRENCY
+        )
+    app.state.ready = not config.WARMUP
+    warm_up = asyncio.create_task(_warm_up(app)) if config.WARMUP else None
+    await job_manager.start()
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    await job_manager.stop()
+    worker_pool.shutdown()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="FusionSim API",
     description="API for running 1D diffusion simulations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware for frontend communication
@@ -55,6 +219,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Time every request and the writing of its response (see metrics.py)
+app.add_middleware(MetricsMiddleware)
+
 class SimulationType(str, Enum):
     """Valid simulation types supported by the API."""
     diffusion = "diffusion"
@@ -62,6 +229,84 @@ class SimulationType(str, Enum):
     advection_diffusion = "advection_diffusion"
 
 
+class SolverEngine(str, Enum):
+    """Solver engines supported by the simulation module."""
+    fipy = "fipy"
+    prefactored = "prefactored"
+    iterative = "iterative"
+
+
+class SimulationBackend(str, Enum):
+    """Simulation backends supported by the simulation module."""
+    fipy = "fipy"
+    numpy = "numpy"
+    analytic = "analytic"
+    parallel = "parallel"
+
+
+class TimeScheme(str, Enum):
+    """Time integration schemes (the explicit scheme needs the numpy backend)."""
+    implicit = "implicit"
+    explicit = "explicit"
+
+
+class MeshType(str, Enum):
+    """Meshes the solver can compute on; results are always returned on the uniform grid."""
+    uniform = "uniform"
+    graded = "graded"
+    adaptive = "adaptive"
+
+
+class InitialCondition(str, Enum):
+    """Initial profiles of the problem registry (see problems.py)."""
+    gaussian = "gaussian"
+    top_hat = "top_hat"
+    cosine = "cosine"
+
+
+class BoundaryCondition(str, Enum):
+    """Boundary conditions of the problem registry (periodic needs the fipy backend)."""
+    neumann = "neumann"
+    dirichlet = "dirichlet"
+    periodic = "periodic"
+
+
+class ProfileFormat(str, Enum):
+    """Export formats of a stored profile."""
+    speedscope = "speedscope"
+    collapsed = "collapsed"
+
+
+class AnimationFormat(str, Enum):
+    """Animation formats returned by /diffusion."""
+    gif = "gif"
+    apng = "apng"
+    webm = "webm"
+    mp4 = "mp4"
+    svg = "svg"
+    json = "json"
+
+
+class ResultFormat(str, Enum):
+    """Binary layouts of the raw results returned by /diffusion/data."""
+    npy = "npy"
+    f32 = "f32"
+
+
+class Compression(str, Enum):
+    """Compression applied to the raw results returned by /diffusion/data."""
+    none = "none"
+    gzip = "gzip"
+    zstd = "zstd"
+
+
+class JobOutput(str, Enum):
+    """Outputs of a completed job returned by /jobs/{id}/result."""
+    gif = "gif"
+    npy = "npy"
+    f32 = "f32"
+
+
 class SimulationParams(BaseModel):
     """
     Parameters for configuring a simulation.
@@ -81,6 +326,10 @@ class SimulationParams(BaseModel):
         1.0, gt=0,
         description="Grid spacing (positive number)"
     )
+    ny: Optional[int] = Field(
+        None, gt=0,
+        description="Number of grid cells in y; set it to run a 2D simulation (fipy backend)"
+    )
     steps: int = Field(
         100, gt=0,
         description="Number of time steps (positive integer)"
@@ -90,8 +339,54 @@ class SimulationParams(BaseModel):
         description="Time step size (positive number)"
     )
     store_frames: int = Field(
-        20, gt=0, le=50,
-        description="Number of frames to include in animation (1-50)"
+        20, gt=0, le=200,
+        description="Number of frames to include in animation (1-200)"
+    )
+    engine: Optional[SolverEngine] = Field(
+        default=None,
+        description=(
+            "Solver engine: 'fipy' rebuilds the system every step, 'prefactored' factorizes it once, "
+            "'iterative' uses preconditioned BiCGSTAB (default 'fipy' in 1D, 'iterative' in 2D)"
+        )
+    )
+    backend: SimulationBackend = Field(
+        default=SimulationBackend.fipy,
+        description=(
+            "Simulation backend: 'fipy', the vectorized 'numpy' implementation, the closed-form "
+            "'analytic' solution for previews (diffusion and heat, pulse away from the boundaries), "
+            "or 'parallel', the numpy implicit scheme split across processes for very large nx"
+        )
+    )
+    scheme: TimeScheme = Field(
+        default=TimeScheme.implicit,
+        description="Time scheme: 'implicit', or 'explicit' (numpy backend, dt limited by stability)"
+    )
+    adaptive: bool = Field(
+        default=False,
+        description="Choose step sizes from a local error estimate, starting from dt (numpy backend, implicit scheme)"
+    )
+    tolerance: float = Field(
+        1e-3, gt=0, le=0.1,
+        description="Largest local error of an adaptive step, relative to the peak value"
+    )
+    mesh: MeshType = Field(
+        default=MeshType.uniform,
+        description="Mesh: 'uniform', 'graded' around the initial pulse, or 'adaptive' (numpy backend, fixed steps)"
+    )
+    cells: Optional[int] = Field(
+        None, gt=0,
+        description="Number of cells of a graded or adaptive mesh, defaults to nx"
+    )
+    initial_condition: Optional[InitialCondition] = Field(
+        default=None,
+        description="Initial profile: 'gaussian' (default), 'top_hat' or 'cosine'"
+    )
+    boundary: Optional[BoundaryCondition] = Field(
+        default=None,
+        description=(
+            "Boundary condition: 'neumann' (no flux), 'dirichlet' (zero value) or 'periodic' (fipy backend); "
+            "defaults to 'dirichlet' for the heat equation and 'neumann' otherwise"
+        )
     )
     
     # Simulation-specific parameters
@@ -116,17 +411,124 @@ class SimulationParams(BaseModel):
             raise ValueError(f"Must be an integer, got {type(v).__name__}")
         return v
 
+    @model_validator(mode="after")
+    def check_compatible_options(self) -> "SimulationParams":
+        """Reject backend, scheme, mesh, dimension and problem settings that cannot be used together."""
+        problem = get_problem(
+            self.simulation_type.value,
+            initial_condition=self.initial_condition.value if self.initial_condition else None,
+            boundary=self.boundary.value if self.boundary else None
+        )
+        check_options(
+            problem, backend=self.backend.value, scheme=self.scheme.value,
+            adaptive=self.adaptive, mesh=self.mesh.value, ny=self.ny
+        )
+        if self.backend == SimulationBackend.analytic:
+            check_applicable(
+                problem, self.nx, self.dx, self.steps, self.dt, D=self.D, k=self.k, velocity=self.velocity
+            )
+        return self
+
+
+class ContinueJobParams(BaseModel):
+    """Parameters for continuing a completed job."""
+    steps: int = Field(
+        ..., gt=0,
+        description="Number of additional time steps (positive integer)"
+    )
+    store_frames: Optional[int] = Field(
+        None, gt=0, le=200,
+        description="Number of frames to store, defaults to that of the continued job (1-200)"
+    )
+
+    @field_validator('steps', 'store_frames')
+    @classmethod
+    def ensure_integers(cls, v: Any) -> Any:
+        """Ensure that integer fields are actually integers."""
+        if v is not None and not isinstance(v, int):
+            raise ValueError(f"Must be an integer, got {type(v).__name__}")
+        return v
+
+
+class BatchRunParams(BaseModel):
+    """Coefficients and time step of one member of a batched simulation."""
+    D: Optional[float] = Field(
+        1.0, gt=0,
+        description="Diffusion coefficient (for diffusion and advection-diffusion)"
+    )
+    k: Optional[float] = Field(
+        1.0, gt=0,
+        description="Thermal conductivity (for heat equation)"
+    )
+    velocity: Optional[float] = Field(
+        1.0,
+        description="Advection velocity (for advection-diffusion)"
+    )
+    dt: float = Field(
+        0.1, gt=0,
+        description="Time step size (positive number)"
+    )
+
+
+class BatchSimulationParams(BaseModel):
+    """
+    Parameters for a batch of simulations sharing a grid and step count.
+    
+    Each entry of ``runs`` sets its own coefficients and time step.
+    """
+    simulation_type: SimulationType = Field(
+        default=SimulationType.diffusion,
+        description="Type of simulation to run"
+    )
+    nx: int = Field(
+        50, gt=0,
+        description="Number of grid cells (positive integer)"
+    )
+    dx: float = Field(
+        1.0, gt=0,
+        description="Grid spacing (positive number)"
+    )
+    steps: int = Field(
+        100, gt=0,
+        description="Number of time steps (positive integer)"
+    )
+    store_frames: int = Field(
+        20, gt=0, le=50,
+        description="Number of frames to store per run (1-50)"
+    )
+    scheme: TimeScheme = Field(
+        default=TimeScheme.implicit,
+        description="Time scheme: 'implicit', or 'explicit' (dt limited by stability)"
+    )
+    runs: List[BatchRunParams] = Field(
+        ..., min_length=1, max_length=1000,
+        description="Coefficients and time step of each run (1-1000)"
+    )
+
+    @field_validator('nx', 'steps', 'store_frames')
+    @classmethod
+    def ensure_integers(cls, v: Any) -> Any:
+        """Ensure that integer fields are actually integers."""
+        if not isinstance(v, int):
+            raise ValueError(f"Must be an integer, got {type(v).__name__}")
+        return v
+
 
 @app.get("/")
-async def root():
-    """Health check endpoint."""
+async def root(request: Request):
+    """Health check endpoint; responds 503 until the worker warm-up is done."""
+    if not request.app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"message": "FusionSim backend is warming up", "status": "warming_up"}
+        )
     return {"message": "FusionSim backend is running", "status": "healthy"}
 
 
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     """Global exception handler for unhandled exceptions."""
-    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error("Unhandled exception: %s", exc)
     logger.error(traceback.format_exc())
     return JSONResponse(
         status_code=500,
@@ -138,16 +540,50 @@ async def generic_exception_handler(request: Request, exc: Exception):
 
 
 @app.post("/diffusion")
-async def run_diffusion_simulation(params: SimulationParams):
+async def run_diffusion_simulation(
+    params: SimulationParams,
+    request: Request,
+    format: AnimationFormat = AnimationFormat.gif,
+    preview: bool = Query(False, description="Render raster formats at reduced resolution, for quick previews"),
+    deviation: bool = Query(
+        False, description=f"Analytic backend only: also return the largest deviation of the numpy backend in {DEVIATION_HEADER}"
+    ),
+    x_fusionsim_profile: Optional[str] = Header(
+        None, description="Profile token (FUSIONSIM_PROFILE_TOKEN) to run this request under the sampling profiler"
+    )
+):
     """
     Run a simulation based on the provided parameters.
     
-    Returns an animated GIF of the simulation results.
+    Returns an animation of the simulation results: an animated GIF by
+    default, or the ``format`` chosen by the client (APNG, WebM or MP4 video,
+    or SVG and JSON that the client draws itself). With ``preview`` the raster
+    formats are rendered at PREVIEW_DPI, a quarter of the pixels. The simulation and the
+    rendering run in the worker pool; if every worker is busy and the admission
+    queue is full, a 503 response with a Retry-After header is returned.
+    
+    Results and animations are cached on the request parameters, and identical
+    requests that arrive while one is being computed share its result.
+    
+    Requests whose estimated cost exceeds the budget get a 413 response. Other
+    requests that need computing take their cost from the client's token
+    bucket, or get a 429 response with a Retry-After header when it is empty.
+    Heavy requests take one of the heavy worker slots.
+    
+    When profiling is enabled and the X-FusionSim-Profile header carries the
+    profile token, the simulation and rendering run under the sampling profiler
+    (bypassing the cache) and the id of the stored profile is returned in the
+    X-FusionSim-Profile-Id header.
+    
+    With ``deviation`` an analytic request also runs the numpy backend and
+    returns its largest deviation from the closed form, relative to the
+    initial peak, in the X-FusionSim-Analytic-Deviation header. The extra
+    solve is cached and charged like a simulation.
     """
     try:
         # Log received parameters
-        logger.info(f"Received simulation request: {params.simulation_type}")
-        logger.debug(f"Parameters: {params.model_dump()}")
+        logger.info("Received simulation request: %s", params.simulation_type)
+        logger.debug("Parameters: %r", params)
         
         # Validate integer parameters
         for param_name, expected_type in [
@@ -155,51 +591,775 @@ async def run_diffusion_simulation(params: SimulationParams):
         ]:
             param_value = getattr(params, param_name)
             if not isinstance(param_value, expected_type):
-                logger.error(f"{param_name} should be {expected_type.__name__}, got {type(param_value).__name__}: {param_value}")
+                logger.error(
+                    "%s should be %s, got %s: %s",
+                    param_name, expected_type.__name__, type(param_value).__name__, param_value
+                )
                 return JSONResponse(
                     status_code=400,
                     content={"detail": f"{param_name} must be {expected_type.__name__}, got {param_value}"}
                 )
         
+        # Check that the format can be produced before simulating
+        if format.value not in available_formats():
+            return JSONResponse(
+                status_code=400,
+                content={"detail": f"The {format.value} format requires the imageio-ffmpeg package"}
+            )
+        if format == AnimationFormat.svg and params.ny is not None:
+            return JSONResponse(status_code=400, content={"detail": "The svg format is only available for 1D simulations"})
+        if deviation and params.backend != SimulationBackend.analytic:
+            return JSONResponse(status_code=400, content={"detail": "deviation is only available on the analytic backend"})
+        
         # Prepare simulation parameters
         sim_params = _prepare_simulation_params(params)
+        results_key = _results_key(params, sim_params)
+        animation_key = make_key("animations", results_key=results_key, format=format.value, preview=preview)
+        deviation_key = make_key("deviations", results_key=results_key, backend="numpy")
+        media_type = MEDIA_TYPES[format.value]
+        cost = _request_cost(params, render=True)
+        deviation_cost = _deviation_cost(params) if deviation else 0
+        rate_limiter.check_cost(cost + deviation_cost)
+        
+        # Profiled requests skip the cache so the simulation and rendering actually run
+        if x_fusionsim_profile is not None:
+            if not _profiling_allowed(x_fusionsim_profile):
+                return JSONResponse(status_code=403, content={"detail": "Profiling is disabled or the profile token is wrong"})
+            animation, profile_id = await _profiled_animation(
+                params, sim_params, format.value, preview, heavy=_is_heavy(params, cost)
+            )
+            headers = {"X-FusionSim-Profile-Id": profile_id}
+            if deviation:
+                headers[DEVIATION_HEADER] = await _cached_deviation(params, sim_params, deviation_key, deviation_cost)
+            return StreamingResponse(BytesIO(animation), media_type=media_type, headers=headers)
+        
+        # Cached and in-flight animations are free, and those of cached results only cost the
+        # rendering; anything else is charged in full to the client
+        charge = 0
+        if not result_cache.contains("animations", animation_key):
+            if result_cache.contains("results", results_key):
+                charge = _request_cost(params, render=True, solve=False)
+            else:
+                charge = cost
+        if deviation and not result_cache.contains("deviations", deviation_key):
+            charge += deviation_cost
+        if charge:
+            rate_limiter.charge(_client_id(request), charge)
+        
+        async def render() -> bytes:
+            with worker_pool.admission(heavy=_is_heavy(params, cost)):
+                results, limits = await _cached_results(params, sim_params, results_key)
+                
+                # Generate animation from results
+                logger.info("Generating %s animation", format.value)
+                try:
+                    animation = await worker_pool.run(
+                        _generate_animation, params, results, limits, fmt=format.value, preview=preview
+                    )
+                except Exception as anim_error:
+                    raise _StageError("Animation generation error", anim_error) from anim_error
+                logger.info("Animation generated successfully")
+                return animation
+        
+        animation = await result_cache.get_or_compute("animations", animation_key, render)
+        ANIMATION_BYTES.observe(len(animation), format=format.value)
+        headers = {}
+        if deviation:
+            headers[DEVIATION_HEADER] = await _cached_deviation(params, sim_params, deviation_key, deviation_cost)
+        return StreamingResponse(BytesIO(animation), media_type=media_type, headers=headers)
+    
+    except _StageError as stage_error:
+        logger.error("%s: %s", stage_error.stage, stage_error.error)
+        return JSONResponse(
+            status_code=500,
+            content={"detail": str(stage_error)}
+        )
+    
+    except PoolSaturatedError as busy:
+        logger.warning("Rejecting simulation request, %s requests in flight", worker_pool.in_flight)
+        return _busy_response(busy)
+    
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting simulation request: %s", limit)
+        return _limit_response(limit)
+    
+    except Exception as e:
+        logger.error("Unhandled exception: %s", e)
+        logger.error(traceback.format_exc())
+        return JSONResponse(
+            status_code=500,
+            content={"detail": str(e), "type": str(type(e).__name__)}
+        )
+
+
+@app.post("/diffusion/data")
+async def get_simulation_data(
+    params: SimulationParams,
+    request: Request,
+    format: ResultFormat = ResultFormat.npy,
+    compression: Compression = Compression.none,
+    frame_step: int = Query(1, ge=1, description="Keep every n-th stored frame"),
+    cell_step: int = Query(1, ge=1, description="Keep every n-th cell"),
+    deviation: bool = Query(
+        False, description=f"Analytic backend only: also return the largest deviation of the numpy backend in {DEVIATION_HEADER}"
+    )
+):
+    """
+    Run a simulation and return the stored timesteps as raw numbers.
+    
+    The response holds one contiguous (frames, nx) array, either as a NumPy
+    ``.npy`` file or as little-endian float32 values after a small header,
+    optionally gzip or zstd compressed. Frames and cells can be thinned out
+    with ``frame_step`` and ``cell_step``; the final frame is always kept.
+    
+    Shares the result cache with ``/diffusion``, so fetching the data and the
+    animation for the same parameters only simulates once. Requests are
+    limited by cost like those of ``/diffusion``, without the rendering cost.
+    ``deviation`` works as for ``/diffusion``.
+    """
+    try:
+        logger.info("Received data request: %s as %s/%s", params.simulation_type, format.value, compression.value)
+        if deviation and params.backend != SimulationBackend.analytic:
+            return JSONResponse(status_code=400, content={"detail": "deviation is only available on the analytic backend"})
+        
+        sim_params = _prepare_simulation_params(params)
+        results_key = _results_key(params, sim_params)
+        deviation_key = make_key("deviations", results_key=results_key, backend="numpy")
+        cost = _request_cost(params, render=False)
+        deviation_cost = _deviation_cost(params) if deviation else 0
+        rate_limiter.check_cost(cost + deviation_cost)
+        charge = 0 if result_cache.contains("results", results_key) else cost
+        if deviation and not result_cache.contains("deviations", deviation_key):
+            charge += deviation_cost
+        if charge:
+            rate_limiter.charge(_client_id(request), charge)
+        with worker_pool.admission(heavy=_is_heavy(params, cost)):
+            results, _ = await _cached_results(params, sim_params, results_key)
+        headers = {}
+        if deviation:
+            headers[DEVIATION_HEADER] = await _cached_deviation(params, sim_params, deviation_key, deviation_cost)
+        
+        try:
+            results, dx = downsample(results, params.dx, frame_step=frame_step, cell_step=cell_step)
+            payload, media_type, filename = encode_results(
+                results, dx, fmt=format.value, compression=compression.value
+            )
+        except ValueError as format_error:
+            return JSONResponse(status_code=400, content={"detail": str(format_error)})
+        
+        logger.info("Returning %sx%s results in %s bytes", results.shape[0], results.shape[1], len(payload))
+        return Response(
+            content=payload,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"', **headers}
+        )
+    
+    except _StageError as stage_error:
+        logger.error("%s: %s", stage_error.stage, stage_error.error)
+        return JSONResponse(
+            status_code=500,
+            content={"detail": str(stage_error)}
+        )
+    
+    except PoolSaturatedError as busy:
+        logger.warning("Rejecting data request, %s requests in flight", worker_pool.in_flight)
+        return _busy_response(busy)
+    
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting data request: %s", limit)
+        return _limit_response(limit)
+    
+    except Exception as e:
+        logger.error("Unhandled exception: %s", e)
+        logger.error(traceback.format_exc())
+        return JSONResponse(
+            status_code=500,
+            content={"detail": str(e), "type": str(type(e).__name__)}
+        )
+
+
+@app.post("/diffusion/stream")
+async def stream_diffusion_simulation(params: SimulationParams, request: Request):
+    """
+    Run a simulation and stream each stored timestep as it is computed.
+    
+    The response is a server-sent event stream. A ``meta`` event describes the
+    run, each ``frame`` event carries one timestep as base64-encoded
+    little-endian float32 values, and the stream ends with an ``end`` event,
+    or an ``error`` event if the simulation fails part way through.
+    
+    Parameter errors, rate limits and a saturated worker pool are reported as
+    regular JSON responses, before the stream starts. Streams are never
+    cached, so every request is charged to the client.
+    """
+    try:
+        logger.info("Received streaming simulation request: %s", params.simulation_type)
+        sim_params = _prepare_simulation_params(params)
+        cost = _request_cost(params, render=False)
+        rate_limiter.check_cost(cost)
+        rate_limiter.charge(_client_id(request), cost)
+        reservation = worker_pool.reserve(heavy=_is_heavy(params, cost))
+    except PoolSaturatedError as busy:
+        logger.warning("Rejecting streaming request, %s requests in flight", worker_pool.in_flight)
+        return _busy_response(busy)
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting streaming request: %s", limit)
+        return _limit_response(limit)
+    
+    frames = worker_pool.stream(
+        iter_simulation,
+        simulation_type=params.simulation_type,
+        store_steps=params.store_frames,
+        **sim_params
+    )
+    
+    # Wait for the initial state so parameter errors still get a plain error response
+    try:
+        first_frame = await frames.__anext__()
+    except Exception as sim_error:
+        await frames.aclose()
+        reservation.release()
+        logger.error("Simulation error: %s", sim_error)
+        return JSONResponse(
+            status_code=500,
+            content={"detail": f"Simulation error: {str(sim_error)}"}
+        )
+    
+    meta = {
+        "simulation_type": params.simulation_type.value,
+        "nx": params.nx,
+        "ny": params.ny,
+        "dx": params.dx,
+        "frames": stored_frame_count(params.steps, params.store_frames),
+        "dtype": "<f4"
+    }
+    
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield _sse_event("meta", json.dumps(meta))
+            yield _sse_event("frame", _encode_frame(first_frame), event_id=0)
+            index = 1
+            try:
+                async for frame in frames:
+                    yield _sse_event("frame", _encode_frame(frame), event_id=index)
+                    index += 1
+            except Exception as sim_error:
+                logger.error("Simulation error while streaming: %s", sim_error)
+                yield _sse_event("error", json.dumps({"detail": f"Simulation error: {str(sim_error)}"}))
+                return
+            logger.info("Streamed %s timesteps", index)
+            yield _sse_event("end", "{}")
+        finally:
+            await frames.aclose()
+            reservation.release()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Frees the slot even if the client disconnects before the stream starts
+        background=BackgroundTask(reservation.release)
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(params: SimulationParams, request: Request):
+    """
+    Queue a simulation as a background job and return its id right away.
+    
+    Poll ``GET /jobs/{id}`` for its progress, then fetch the animation or the
+    raw results from ``GET /jobs/{id}/result``. Jobs are charged to the
+    client like interactive requests, against a larger per-job budget, and
+    jobs whose results would be larger than JOB_MAX_RESULT_BYTES are
+    rejected with a 413 response.
+    """
+    logger.info("Received job request: %s", params.simulation_type)
+    simulation = {
+        "simulation_type": params.simulation_type.value,
+        "store_steps": params.store_frames,
+        **_prepare_simulation_params(params)
+    }
+    cost = _request_cost(params, render=True)
+    try:
+        rate_limiter.check_cost(cost, job=True)
+        job = await job_manager.submit(
+            params.model_dump(mode="json"), simulation,
+            heavy=_is_heavy(params, cost),
+            charge=lambda: rate_limiter.charge(_client_id(request), cost)
+        )
+    except JobLimitError as limit_error:
+        logger.warning("Rejecting job request: %s", limit_error)
+        return JSONResponse(status_code=413, content={"detail": str(limit_error)})
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting job request: %s", limit)
+        return _limit_response(limit)
+    return job.describe()
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """List every job in the job store, oldest first."""
+    return [job.describe() for job in job_manager.list()]
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the status and progress of a job."""
+    try:
+        return job_manager.get(job_id).describe()
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are returned unchanged."""
+    try:
+        job = await job_manager.cancel(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.describe()
+
+
+@app.post("/jobs/{job_id}/continue", status_code=202)
+async def continue_job(job_id: str, params: ContinueJobParams, request: Request):
+    """
+    Queue a job that continues a completed job for more steps.
+    
+    The new job starts from the final state of the completed one, saved as a
+    checkpoint, so only the additional steps are simulated.
+    """
+    logger.info("Received request to continue job %s for %s steps", job_id, params.steps)
+    try:
+        parent = job_manager.get(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if parent.simulation.get("backend") == SimulationBackend.analytic.value:
+        raise HTTPException(
+            status_code=400,
+            detail="Jobs on the analytic backend cannot be continued: the closed-form solution "
+                   "only starts from the initial condition, not from a saved state"
+        )
+    continuation = SimulationParams(**{
+        **parent.request, "steps": params.steps, "store_frames": params.store_frames or parent.request["store_frames"]
+    })
+    cost = _request_cost(continuation, render=True)
+    try:
+        rate_limiter.check_cost(cost, job=True)
+        job = await job_manager.continue_job(
+            job_id, params.steps, store_steps=params.store_frames,
+            heavy=_is_heavy(continuation, cost),
+            charge=lambda: rate_limiter.charge(_client_id(request), cost)
+        )
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    except JobStateError as state_error:
+        return JSONResponse(status_code=409, content={"detail": str(state_error)})
+    except JobLimitError as limit_error:
+        logger.warning("Rejecting job request: %s", limit_error)
+        return JSONResponse(status_code=413, content={"detail": str(limit_error)})
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting job request: %s", limit)
+        return _limit_response(limit)
+    return job.describe()
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    format: JobOutput = JobOutput.gif,
+    compression: Compression = Compression.none
+):
+    """
+    Fetch the output of a completed job.
+    
+    Returns the animated GIF by default. With ``format=npy`` or ``format=f32``
+    the stored timesteps are returned as raw numbers instead, in the same
+    layouts as ``/diffusion/data``.
+    """
+    try:
+        job = job_manager.get(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status != "completed":
+        return JSONResponse(
+            status_code=409,
+            content={"detail": f"Job {job_id} is {job.status}, results are only available once it has completed"}
+        )
+    
+    if format == JobOutput.gif:
+        return FileResponse(job_manager.result_path(job, ANIMATION_FILE), media_type="image/gif")
+    
+    results = np.load(job_manager.result_path(job, RESULTS_FILE), mmap_mode="r")
+    try:
+        payload, media_type, filename = await asyncio.to_thread(
+            encode_results, results, job.simulation["dx"], fmt=format.value, compression=compression.value
+        )
+    except ValueError as format_error:
+        return JSONResponse(status_code=400, content={"detail": str(format_error)})
+    return Response(
+        content=payload,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/cache")
+async def cache_stats():
+    """Report hit/miss counters and memory usage of the result cache."""
+    return result_cache.stats()
+
+
+@app.get("/profiles")
+async def list_stored_profiles(
+    x_fusionsim_profile: Optional[str] = Header(None, description="Profile token (FUSIONSIM_PROFILE_TOKEN)")
+):
+    """List the stored profiles, newest first; needs the profile token."""
+    if not _profiling_allowed(x_fusionsim_profile):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the profile token is wrong")
+    return await asyncio.to_thread(list_profiles, config.PROFILES_DIR)
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: ProfileFormat = ProfileFormat.speedscope,
+    x_fusionsim_profile: Optional[str] = Header(None, description="Profile token (FUSIONSIM_PROFILE_TOKEN)")
+):
+    """
+    Download a stored profile; needs the profile token.
+    
+    ``format=speedscope`` (default) returns a file for https://www.speedscope.app;
+    ``format=collapsed`` returns collapsed stacks for flame graph tools.
+    """
+    if not _profiling_allowed(x_fusionsim_profile):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the profile token is wrong")
+    try:
+        profile = await asyncio.to_thread(load_profile, config.PROFILES_DIR, profile_id)
+    except ProfileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    
+    if format == ProfileFormat.collapsed:
+        content, media_type, filename = to_collapsed(profile), "text/plain", f"{profile_id}.collapsed.txt"
+    else:
+        content, media_type, filename = json.dumps(to_speedscope(profile)), "application/json", f"{profile_id}.speedscope.json"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Report request phase timings, queue depth and cache counters in the Prometheus text format.
+    
+    Phase timings are histograms of ``fusionsim_phase_seconds`` labelled by phase:
+    validation, mesh_setup, solve_step (per time step), render_frame, one
+    <format>_encode phase per animation format (e.g. gif_encode) and
+    response_write. ``fusionsim_animation_bytes`` is the size of the returned
+    animations by format.
+    """
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/diffusion/batch")
+async def run_batch_simulation(params: BatchSimulationParams, request: Request):
+    """
+    Run a batch of simulations in one vectorized pass.
+    
+    Returns the stacked results as a NumPy ``.npy`` file holding an array of
+    shape (runs, frames, nx). Load it with ``numpy.load``. Requests are
+    limited by the total cost of their runs like those of ``/diffusion/data``.
+    """
+    try:
+        logger.info("Received batch simulation request: %s x %s", params.simulation_type, len(params.runs))
+        
+        # Keep only the coefficients used by the simulation type
+        coefficient_names = {
+            SimulationType.diffusion: ("D",),
+            SimulationType.heat: ("k",),
+            SimulationType.advection_diffusion: ("D", "velocity"),
+        }[params.simulation_type]
+        parameter_sets = [
+            {name: getattr(run, name) for name in coefficient_names + ("dt",)}
+            for run in params.runs
+        ]
+        
+        cost = _batch_cost(params)
+        rate_limiter.check_cost(cost)
+        rate_limiter.charge(_client_id(request), cost)
+        with worker_pool.admission(heavy=cost >= config.HEAVY_REQUEST_COST):
+            logger.info("Starting batch simulation calculation")
+            try:
+                results = await worker_pool.run(
+                    run_simulation_batch,
+                    simulation_type=params.simulation_type.value,
+                    parameter_sets=parameter_sets,
+                    nx=params.nx,
+                    dx=params.dx,
+                    steps=params.steps,
+                    store_steps=params.store_frames,
+                    scheme=params.scheme.value
+                )
+                logger.info("Batch simulation completed with result shape %s", results.shape)
+            except Exception as sim_error:
+                logger.error("Error in batch simulation: %s", sim_error)
+                return JSONResponse(
+                    status_code=500,
+                    content={"detail": f"Simulation error: {str(sim_error)}"}
+                )
         
-        # Run the simulation
+        buffer = BytesIO()
+        np.save(buffer, results)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="batch.npy"'}
+        )
+    
+    except PoolSaturatedError as busy:
+        logger.warning("Rejecting batch request, %s requests in flight", worker_pool.in_flight)
+        return _busy_response(busy)
+    
+    except (CostLimitError, RateLimitedError) as limit:
+        logger.warning("Rejecting batch request: %s", limit)
+        return _limit_response(limit)
+    
+    except Exception as e:
+        logger.error("Unhandled exception: %s", e)
+        logger.error(traceback.format_exc())
+        return JSONResponse(
+            status_code=500,
+            content={"detail": str(e), "type": str(type(e).__name__)}
+        )
+
+
+class _StageError(Exception):
+    """Wraps a failure in one stage of a request so it can be reported with that stage's name."""
+    
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"{stage}: {str(error)}")
+        self.stage = stage
+        self.error = error
+
+
+def _busy_response(busy: PoolSaturatedError) -> JSONResponse:
+    """Build the 503 response returned when the worker pool is saturated."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(busy)},
+        headers={"Retry-After": str(busy.retry_after)}
+    )
+
+
+def _limit_response(limit: Union[CostLimitError, RateLimitedError]) -> JSONResponse:
+    """Build the 413 response of a request over budget, or the 429 response of a rate-limited client."""
+    if isinstance(limit, CostLimitError):
+        return JSONResponse(status_code=413, content={"detail": str(limit)})
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(limit)},
+        headers={"Retry-After": str(limit.retry_after)}
+    )
+
+
+def _client_id(request: Request) -> str:
+    """Identify the client of a request for rate limiting: CLIENT_HEADER if configured, else the peer address."""
+    if config.CLIENT_HEADER is not None:
+        forwarded = request.headers.get(config.CLIENT_HEADER)
+        if forwarded:
+            # X-Forwarded-For lists the original client first
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client is not None else "unknown"
+
+
+def _request_cost(params: SimulationParams, render: bool, solve: bool = True) -> int:
+    """Estimate the cost of a simulation request in cell updates (see rate_limit.estimate_cost)."""
+    processes = block_count(params.nx, config.PARALLEL_WORKERS) if params.backend == SimulationBackend.parallel else 1
+    return estimate_cost(
+        params.nx, params.steps, stored_frame_count(params.steps, params.store_frames),
+        ny=params.ny, cells=params.cells if params.mesh != MeshType.uniform else None,
+        backend=params.backend.value, render=render, processes=processes, solve=solve
+    )
+
+
+def _is_heavy(params: SimulationParams, cost: int) -> bool:
+    """
+    Decide whether a simulation request takes a heavy slot of the worker pool.
+    
+    Runs on the parallel backend start several processes from one slot, so
+    they are heavy whatever their cost.
+    """
+    return cost >= config.HEAVY_REQUEST_COST or params.backend == SimulationBackend.parallel
+
+
+def _deviation_cost(params: SimulationParams) -> int:
+    """Estimate the cost of the numpy run that an analytic request is compared with."""
+    return estimate_cost(
+        params.nx, params.steps, stored_frame_count(params.steps, params.store_frames),
+        backend="numpy", render=False
+    )
+
+
+def _batch_cost(params: BatchSimulationParams) -> int:
+    """Estimate the cost of a batch request as the sum of the costs of its runs."""
+    frames = stored_frame_count(params.steps, params.store_frames)
+    return sum(
+        estimate_cost(params.nx, params.steps, frames, backend="numpy", render=False)
+        for _ in params.runs
+    )
+
+
+def _results_key(params: SimulationParams, sim_params: Dict[str, Union[int, float]]) -> str:
+    """Build the cache key of the stored timesteps of a simulation request."""
+    return make_key(
+        "results",
+        simulation_type=params.simulation_type,
+        store_steps=params.store_frames,
+        **sim_params
+    )
+
+
+async def _cached_results(
+    params: SimulationParams,
+    sim_params: Dict[str, Union[int, float]],
+    results_key: str
+) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Return the stored timesteps of a simulation and their limits, running it on a cache miss.
+    
+    Callers must hold a worker pool slot. Simulation failures are raised as
+    a _StageError. Analytic runs are only a few array expressions, so they
+    are evaluated in a thread instead of being shipped to a worker process.
+    
+    The minimum and maximum are tracked by the simulation as it stores its
+    frames and cached next to the results under the same key, so rendering
+    never makes a separate pass over the results to find them.
+    """
+    computed_limits: Optional[Tuple[float, float]] = None
+    
+    async def simulate() -> np.ndarray:
+        nonlocal computed_limits
         logger.info("Starting simulation calculation")
+        run = asyncio.to_thread if params.backend == SimulationBackend.analytic else worker_pool.run
         try:
-            results = run_simulation(
+            results, computed_limits = await run(
+                run_simulation_with_limits,
                 simulation_type=params.simulation_type,
                 store_steps=params.store_frames,
                 **sim_params
             )
-            logger.info(f"Simulation completed with {len(results)} timesteps")
         except Exception as sim_error:
-            logger.error(f"Error in simulation: {str(sim_error)}")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": f"Simulation error: {str(sim_error)}"}
+            raise _StageError("Simulation error", sim_error) from sim_error
+        logger.info("Simulation completed with %s timesteps", len(results))
+        return results
+    
+    results = await result_cache.get_or_compute("results", results_key, simulate)
+    
+    async def find_limits() -> np.ndarray:
+        if computed_limits is not None:
+            return np.array(computed_limits)
+        # The limits of results from the disk tier may have been evicted or never stored
+        return await asyncio.to_thread(lambda: np.array([np.nanmin(results), np.nanmax(results)]))
+    
+    limits = await result_cache.get_or_compute("limits", results_key, find_limits)
+    return results, (float(limits[0]), float(limits[1]))
+
+
+async def _cached_deviation(
+    params: SimulationParams,
+    sim_params: Dict[str, Union[int, float]],
+    deviation_key: str,
+    cost: int
+) -> str:
+    """
+    Return the deviation of the numpy backend from an analytic request, formatted for its header.
+    
+    On a cache miss both runs are made by analytic.analytic_deviation in a
+    worker process, under an admission of their own, so callers must not
+    hold a worker pool slot. Failures are raised as a _StageError.
+    """
+    async def compare() -> np.ndarray:
+        coefficients = {name: sim_params[name] for name in ("D", "k", "velocity") if name in sim_params}
+        with worker_pool.admission(heavy=_is_heavy(params, cost)):
+            try:
+                value = await worker_pool.run(
+                    analytic_deviation, params.simulation_type.value,
+                    nx=params.nx, dx=params.dx, steps=params.steps, dt=params.dt,
+                    store_steps=params.store_frames, backend="numpy",
+                    boundary=sim_params.get("boundary"), **coefficients
+                )
+            except Exception as deviation_error:
+                raise _StageError("Deviation error", deviation_error) from deviation_error
+        return np.array([value])
+    
+    deviation = await result_cache.get_or_compute("deviations", deviation_key, compare)
+    return f"{float(deviation[0]):.6e}"
+
+
+def _profiling_allowed(token: Optional[str]) -> bool:
+    """Check a profile token against the configured one; profiling is off when none is configured."""
+    if config.PROFILE_TOKEN is None or token is None:
+        return False
+    return secrets.compare_digest(token.encode(), config.PROFILE_TOKEN.encode())
+
+
+async def _profiled_animation(
+    params: SimulationParams,
+    sim_params: Dict[str, Union[int, float]],
+    fmt: str = "gif",
+    preview: bool = False,
+    heavy: bool = False
+) -> Tuple[bytes, str]:
+    """
+    Run a simulation and render its animation under the sampling profiler.
+    
+    Both stages are sampled in their worker process; the samples are merged
+    into one stored profile. Failures are raised as a _StageError. Heavy
+    requests are admitted to the heavy lane of the worker pool.
+    
+    Returns:
+        Tuple of the animation bytes in format fmt and the id of the stored profile
+    """
+    interval = config.PROFILE_INTERVAL_MS / 1000
+    with worker_pool.admission(heavy=heavy):
+        logger.info("Starting profiled simulation calculation")
+        try:
+            results, simulation_stacks = await worker_pool.run(
+                profile_call, run_simulation,
+                kwargs=dict(simulation_type=params.simulation_type, store_steps=params.store_frames, **sim_params),
+                interval=interval
             )
+        except Exception as sim_error:
+            raise _StageError("Simulation error", sim_error) from sim_error
         
-        # Generate animation from results
-        logger.info("Generating animation")
         try:
-            gif_bytes = _generate_animation(params, results)
-            logger.info("Animation generated successfully")
-            return StreamingResponse(BytesIO(gif_bytes), media_type="image/gif")
-        except Exception as anim_error:
-            logger.error(f"Animation generation error: {str(anim_error)}")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": f"Animation generation error: {str(anim_error)}"}
+            animation, render_stacks = await worker_pool.run(
+                profile_call, _generate_animation, (params, results), {"fmt": fmt, "preview": preview},
+                interval=interval
             )
+        except Exception as anim_error:
+            raise _StageError("Animation generation error", anim_error) from anim_error
     
-    except Exception as e:
-        logger.error(f"Unhandled exception: {str(e)}")
-        logger.error(traceback.format_exc())
-        return JSONResponse(
-            status_code=500,
-            content={"detail": str(e), "type": str(type(e).__name__)}
-        )
+    stacks = Counter(simulation_stacks)
+    stacks.update(render_stacks)
+    metadata = {"endpoint": "/diffusion", "format": fmt, "preview": preview, "request": params.model_dump(mode="json")}
+    profile_id = await asyncio.to_thread(save_profile, config.PROFILES_DIR, dict(stacks), interval, metadata)
+    logger.info("Stored profile %s with %s samples", profile_id, sum(stacks.values()))
+    return animation, profile_id
+
+
+def _sse_event(event: str, data: str, event_id: Optional[int] = None) -> str:
+    """Format one server-sent event."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {data}\n\n"
+
+
+def _encode_frame(frame: np.ndarray) -> str:
+    """Encode a timestep as base64 little-endian float32 values."""
+    return base64.b64encode(np.asarray(frame, dtype="<f4").tobytes()).decode("ascii")
 
 
 def _prepare_simulation_params(params: SimulationParams) -> Dict[str, Union[int, float]]:
@@ -213,95 +1373,222 @@ def _prepare_simulation_params(params: SimulationParams) -> Dict[str, Union[int,
         "nx": params.nx,
         "dx": params.dx,
         "steps": params.steps,
-        "dt": params.dt
+        "dt": params.dt,
+        "engine": params.engine.value if params.engine else default_engine(params.ny),
+        "backend": params.backend.value,
+        "scheme": params.scheme.value
     }
+    if params.adaptive:
+        sim_params["adaptive"] = True
+        sim_params["tolerance"] = params.tolerance
+    if params.mesh != MeshType.uniform:
+        sim_params["mesh"] = params.mesh.value
+        sim_params["cells"] = params.cells or params.nx
+    if params.ny is not None:
+        sim_params["ny"] = params.ny
+    if params.initial_condition is not None:
+        sim_params["initial_condition"] = params.initial_condition.value
+    if params.boundary is not None:
+        sim_params["boundary"] = params.boundary.value
+    if params.backend == SimulationBackend.parallel:
+        sim_params["workers"] = config.PARALLEL_WORKERS
     
     # Add simulation-specific parameters
     if params.simulation_type == SimulationType.diffusion:
         sim_params["D"] = params.D
-        logger.debug(f"Configured diffusion simulation with D={params.D}")
+        logger.debug("Configured diffusion simulation with D=%s", params.D)
     elif params.simulation_type == SimulationType.heat:
         sim_params["k"] = params.k
-        logger.debug(f"Configured heat equation simulation with k={params.k}")
+        logger.debug("Configured heat equation simulation with k=%s", params.k)
     elif params.simulation_type == SimulationType.advection_diffusion:
         sim_params["D"] = params.D
         sim_params["velocity"] = params.velocity
-        logger.debug(f"Configured advection-diffusion simulation with D={params.D}, velocity={params.velocity}")
+        logger.debug("Configured advection-diffusion simulation with D=%s, velocity=%s", params.D, params.velocity)
     
     return sim_params
 
 
-def _generate_animation(params: SimulationParams, results: List[np.ndarray]) -> bytes:
+def _generate_animation(
+    params: SimulationParams,
+    results: np.ndarray,
+    limits: Optional[Tuple[float, float]] = None,
+    fmt: str = "gif",
+    preview: bool = False
+) -> bytes:
     """
-    Generate an animated GIF from simulation results.
+    Generate an animation from simulation results.
+    
+    For the raster formats (GIF, APNG, WebM, MP4), 1D results are drawn as a
+    line plot and 2D results as a heatmap. Lines with more cells than the plot
+    has pixels across are drawn through the min/max envelope of each pixel
+    column (see animation_formats.envelope_indices), so drawing time does not
+    grow with nx and peaks keep their exact height. Frames are rendered in memory: a
+    single figure and artist are reused. The static parts (axes, grid, labels)
+    are drawn once and saved; for each frame that background is restored and
+    only the data and title are redrawn (blitting), then the frame is captured
+    straight from the Agg canvas buffer and handed to the encoder. Results are
+    read one frame at a time, so a memory-mapped array is never loaded whole.
+    
+    The SVG and JSON formats are written from the results directly, without
+    matplotlib. The encoding time is recorded as the "<fmt>_encode" phase.
     
     Args:
         params: Simulation parameters
-        results: List of numpy arrays with simulation results at different timesteps
+        results: Array of shape (timesteps, nx), or (timesteps, ny, nx) for a 2D
+            simulation, with the simulation results; it may be memory-mapped
+        limits: Minimum and maximum of the results if already known, e.g. from a FrameBuffer
+        fmt: Animation format, one of animation_formats.ANIMATION_FORMATS
+        preview: Render raster frames at PREVIEW_DPI instead of RENDER_DPI
     
     Returns:
-        Bytes of the generated GIF
+        Bytes of the generated animation
+    
+    Raises:
+        ValueError: If the format is unknown or unavailable, or is svg for 2D results
     """
-    # Get plot title and y-label based on simulation type
+    # Get plot title and value label based on simulation type
     plot_config = {
         SimulationType.diffusion: {
-            'title': "1D Diffusion Simulation",
+            'title': "Diffusion Simulation",
             'y_label': "Concentration"
         },
         SimulationType.heat: {
-            'title': "1D Heat Equation Simulation",
+            'title': "Heat Equation Simulation",
             'y_label': "Temperature"
         },
         SimulationType.advection_diffusion: {
-            'title': "1D Advection-Diffusion Simulation",
+            'title': "Advection-Diffusion Simulation",
             'y_label': "Concentration"
         }
     }
     
-    plot_title = plot_config[params.simulation_type]['title']
+    dimension = "2D" if results.ndim == 3 else "1D"
+    plot_title = f"{dimension} {plot_config[params.simulation_type]['title']}"
     y_label = plot_config[params.simulation_type]['y_label']
     
-    # Create temporary directory for image files
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        logger.debug(f"Created temporary directory: {tmp_dir}")
-        filenames = []
-        
-        # Calculate consistent y-axis limits for all frames
-        all_results = np.concatenate(results)
-        y_min = np.min(all_results) * 0.9  # Add 10% margin
-        y_max = np.max(all_results) * 1.1
-        
-        # Generate plot for each timestep
-        x_values = np.linspace(0, params.nx * params.dx, params.nx)
-        
-        logger.debug(f"Generating {len(results)} plot frames")
-        for i, result in enumerate(results):
-            plt.figure(figsize=(10, 6))
-            plt.plot(x_values, result)
-            plt.title(f"{plot_title} - Timestep {i}")
-            plt.xlabel('Position')
-            plt.ylabel(y_label)
-            plt.ylim(y_min, y_max)
-            plt.grid(True)
-            
-            # Save the plot
-            filename = os.path.join(tmp_dir, f"frame_{i:03d}.png")
-            plt.savefig(filename)
-            plt.close()
-            filenames.append(filename)
-        
-        # Create an animated GIF
-        logger.debug("Creating animated GIF")
-        gif_file = os.path.join(tmp_dir, "animation.gif")
-        
-        with imageio.get_writer(gif_file, mode='I', duration=0.3) as writer:
-            for filename in filenames:
-                image = imageio.imread(filename)
-                writer.append_data(image)
-        
-        # Read the GIF file
-        with open(gif_file, "rb") as f:
-            return f.read()
+    # Calculate consistent value limits for all frames, reducing the array in place
+    if limits is None:
+        limits = (float(np.nanmin(results)), float(np.nanmax(results)))
+    
+    # Formats drawn by the client are written straight from the results
+    if fmt not in RASTER_FORMATS:
+        encode = {"svg": encode_svg, "json": encode_json}.get(fmt)
+        if encode is None:
+            raise ValueError(f"Unknown animation format: {fmt}")
+        with timed(f"{fmt}_encode"):
+            return encode(results, params.dx, plot_title, y_label, limits)
+    
+    encoder = FrameEncoder(fmt)
+    dpi = PREVIEW_DPI if preview else RENDER_DPI
+    if results.ndim == 3:
+        frames = _iter_heatmap_frames(params, results, plot_title, y_label, limits, dpi)
+    else:
+        frames = _iter_line_frames(params, results, plot_title, y_label, limits, dpi)
+    
+    # Encode the animation in memory (0.3 s per frame, looping); the encoder writes the file on finish
+    logger.debug("Rendering and encoding %s frames as %s", len(results), fmt)
+    encode_seconds = 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        encoder.append(frame)
+        encode_seconds += time.perf_counter() - start
+    start = time.perf_counter()
+    animation = encoder.finish()
+    encode_seconds += time.perf_counter() - start
+    record_phase(f"{fmt}_encode", encode_seconds)
+    return animation
+
+
+def _iter_line_frames(
+    params: SimulationParams,
+    results: np.ndarray,
+    plot_title: str,
+    y_label: str,
+    limits: Tuple[float, float],
+    dpi: int = RENDER_DPI
+) -> Iterator[np.ndarray]:
+    """Render 1D results as a line plot, yielding the RGB image of each timestep."""
+    y_min = limits[0] * 0.9  # Add 10% margin
+    y_max = limits[1] * 1.1
+    
+    # Set up one figure, drawn by the Agg canvas without going through pyplot
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    x_values = np.linspace(0, params.nx * params.dx, params.nx)
+    figure = Figure(figsize=(10, 6), dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    # Each frame is drawn through the extremes of the cells under each pixel column of the axes
+    columns = int(np.ceil(axes.bbox.width)) * ENVELOPE_RUNS_PER_PIXEL
+    cells = envelope_indices(results[0], columns)
+    line, = axes.plot(x_values[cells], results[0][cells], animated=True)
+    axes.update_datalim([(x_values[0], limits[0]), (x_values[-1], limits[1])])
+    axes.autoscale_view()
+    title = axes.set_title(f"{plot_title} - Timestep 0", animated=True)
+    axes.set_xlabel('Position')
+    axes.set_ylabel(y_label)
+    axes.set_ylim(y_min, y_max)
+    axes.grid(True)
+    
+    # Draw the static background once
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    
+    # Render each timestep by updating the line data in place
+    for i, result in enumerate(results):
+        with timed("render_frame"):
+            cells = envelope_indices(result, columns)
+            line.set_data(x_values[cells], result[cells])
+            title.set_text(f"{plot_title} - Timestep {i}")
+            canvas.restore_region(background)
+            axes.draw_artist(line)
+            axes.draw_artist(title)
+            frame = np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+        yield frame
+
+
+def _iter_heatmap_frames(
+    params: SimulationParams,
+    results: np.ndarray,
+    plot_title: str,
+    value_label: str,
+    limits: Tuple[float, float],
+    dpi: int = RENDER_DPI
+) -> Iterator[np.ndarray]:
+    """Render 2D results as a heatmap with a fixed color scale, yielding the RGB image of each timestep."""
+    ny, nx = results.shape[1:]
+    
+    # Set up one figure, drawn by the Agg canvas without going through pyplot
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    figure = Figure(figsize=(10, 6), dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    image = axes.imshow(
+        results[0], origin="lower", extent=(0, nx * params.dx, 0, ny * params.dx),
+        vmin=limits[0], vmax=limits[1], cmap="viridis", animated=True
+    )
+    figure.colorbar(image, ax=axes, label=value_label)
+    title = axes.set_title(f"{plot_title} - Timestep 0", animated=True)
+    axes.set_xlabel('x')
+    axes.set_ylabel('y')
+    
+    # Draw the static background once
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    
+    # Render each timestep by updating the image data in place
+    for i, result in enumerate(results):
+        with timed("render_frame"):
+            image.set_data(result)
+            title.set_text(f"{plot_title} - Timestep {i}")
+            canvas.restore_region(background)
+            axes.draw_artist(image)
+            axes.draw_artist(title)
+            frame = np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+        yield frame
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+"""
+FusionSim Meshes
+----------------
+Non-uniform 1D meshes that put cells where the solution needs them.
+
+A simulation request always describes a uniform "display" grid of nx cells of
+size dx, which defines the domain, the initial pulse and the output. The
+solver may instead compute on a mesh of fewer cells covering the same domain:
+1. "uniform": the display grid itself
+2. "graded": a fixed mesh, graded so that cells are concentrated around the
+   initial pulse and coarse elsewhere
+3. "adaptive": a mesh that is regraded around the current solution as the
+   run progresses (NumPy backend only)
+
+Meshes are built by equidistribution: faces are placed so that every cell
+holds the same share of a monitor function that grows with the curvature of
+the solution. Values are moved between meshes conservatively, and stored
+timesteps are interpolated back onto the display grid.
+"""
+
+from typing import Literal
+
+import numpy as np
+
+# Type alias for mesh types
+MeshType = Literal["uniform", "graded", "adaptive"]
+MESH_TYPES = ("uniform", "graded", "adaptive")
+
+# Share of the monitor function spread evenly over the domain. It bounds the ratio
+# of the widest to the narrowest cell and keeps flat regions from being emptied.
+MONITOR_FLOOR = 0.2
+
+# Number of sample points per computational cell used to integrate the monitor
+MONITOR_SAMPLES = 8
+
+
+def face_positions(widths: np.ndarray) -> np.ndarray:
+    """Return the n + 1 face positions of a mesh with the given cell widths, starting at 0."""
+    return np.concatenate(([0.0], np.cumsum(widths)))
+
+
+def mesh_centers(widths: np.ndarray) -> np.ndarray:
+    """Return the cell-center positions of a mesh with the given cell widths."""
+    return np.cumsum(widths) - widths / 2
+
+
+def equidistributed_widths(x: np.ndarray, values: np.ndarray, cells: int, length: float) -> np.ndarray:
+    """
+    Build a mesh whose cells are concentrated where the solution is curved.
+
+    The monitor function is MONITOR_FLOOR plus the square root of the
+    normalized second derivative, which equidistributes the interpolation
+    error of a piecewise-linear profile.
+
+    Args:
+        x: Increasing sample positions covering the domain
+        values: Solution values at the sample positions
+        cells: Number of cells of the new mesh
+        length: Length of the domain, which starts at 0
+
+    Returns:
+        Array of shape (cells,) with the cell widths, summing to length
+    """
+    if cells <= 0:
+        raise ValueError(f"cells must be positive, got {cells}")
+
+    # Sample the solution on a fine uniform grid to integrate the monitor
+    samples = np.linspace(0.0, length, max(cells * MONITOR_SAMPLES, 16) + 1)
+    profile = np.interp(samples, x, values)
+    curvature = np.abs(np.gradient(np.gradient(profile, samples), samples))
+    peak = curvature.max()
+    monitor = MONITOR_FLOOR + (np.sqrt(curvature / peak) if peak > 0 else 0.0)
+
+    # Place faces at equal steps of the cumulative monitor
+    cumulative = np.concatenate(([0.0], np.cumsum((monitor[1:] + monitor[:-1]) / 2 * np.diff(samples))))
+    faces = np.interp(np.linspace(0.0, cumulative[-1], cells + 1), cumulative, samples)
+    faces[0], faces[-1] = 0.0, length
+    return np.diff(faces)
+
+
+def remap(widths: np.ndarray, values: np.ndarray, new_widths: np.ndarray) -> np.ndarray:
+    """
+    Transfer cell averages from one mesh onto another covering the same domain.
+
+    The cumulative integral of the solution is interpolated monotonically at
+    the new faces and differenced, so the total amount is conserved exactly
+    and no new extrema appear.
+
+    Args:
+        widths: Cell widths of the current mesh
+        values: Cell averages on the current mesh
+        new_widths: Cell widths of the new mesh
+
+    Returns:
+        Cell averages on the new mesh
+    """
+    from scipy.interpolate import PchipInterpolator
+
+    cumulative = np.concatenate(([0.0], np.cumsum(values * widths)))
+    integral = PchipInterpolator(face_positions(widths), cumulative)
+    new_faces = face_positions(new_widths)
+    new_faces[-1] = face_positions(widths)[-1]
+    return np.diff(integral(new_faces)) / new_widths
+
+
+def to_uniform(widths: np.ndarray, values: np.ndarray, nx: int, dx: float) -> np.ndarray:
+    """
+    Interpolate cell values from a mesh onto the cell centers of a uniform grid.
+
+    Args:
+        widths: Cell widths of the mesh
+        values: Values at the cell centers of the mesh
+        nx: Number of cells of the uniform grid
+        dx: Cell size of the uniform grid
+
+    Returns:
+        Array of shape (nx,)
+    """
+    return np.interp((np.arange(nx) + 0.5) * dx, mesh_centers(widths), values)
@@ -0,0 +1,320 @@
+"""
+FusionSim Metrics
+-----------------
+Per-phase timings and server gauges, exposed in the Prometheus text format.
+
+A request goes through these phases, each recorded in the
+``fusionsim_phase_seconds`` histogram:
+1. "validation": checking the simulation parameters
+2. "mesh_setup": building the mesh, initial state and operators, up to the initial frame
+3. "solve_step": time per time step, averaged over each stored-frame interval
+4. "render_frame": drawing one animation frame
+5. "<format>_encode" (e.g. "gif_encode", "webm_encode"): encoding the animation
+   in the requested format
+6. "response_write": sending the response body to the client
+
+Simulations and rendering run in worker processes, whose metrics are not
+visible to the server. Work submitted through the worker pool therefore runs
+under call_collecting(), which gathers the phases recorded in the worker and
+returns them with the result; the pool then observes them in the server
+process.
+
+Only the standard library and NumPy are used; no Prometheus client is needed.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+# Phases of a request, in the order they happen
+PHASES = (
+    "validation", "mesh_setup", "solve_step", "render_frame",
+    "gif_encode", "apng_encode", "webm_encode", "mp4_encode", "svg_encode", "json_encode",
+    "response_write"
+)
+
+# Histogram bucket upper bounds in seconds, from a NumPy time step to a long run
+DEFAULT_BUCKETS = (
+    1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0
+)
+
+# Recorded phase timings: (phase, seconds, count)
+PhaseTiming = Tuple[str, float, int]
+
+# Animation size bucket upper bounds in bytes, from 1 KiB to 64 MiB
+BYTE_BUCKETS = tuple(1024 * 4 ** power for power in range(9))
+
+# Labels and value of one sample of a metric
+Sample = Tuple[Dict[str, str], float]
+
+
+class Histogram:
+    """A thread-safe histogram with fixed buckets, optionally split by labels."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            name: Metric name
+            help: Description shown in the exposition
+            labelnames: Names of the labels every observation must give
+            buckets: Increasing upper bounds of the buckets; +Inf is added
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, count: int = 1, **labels: str) -> None:
+        """
+        Record a value, ``count`` times (e.g. the mean time of count steps).
+
+        Raises:
+            ValueError: If the labels do not match the label names
+        """
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += count
+            series["sum"] += value * count
+            series["count"] += count
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a block of code."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of the histogram."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: {**value, "counts": list(value["counts"])} for key, value in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = np.cumsum(values["counts"])
+            for bound, total in zip(self.buckets + (math.inf,), cumulative):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {int(total)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(values['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {values['count']}")
+        return lines
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Gauge:
+    """A metric whose samples are read from a callback when the metrics are rendered."""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Iterable[Sample]], kind: str = "gauge"):
+        """
+        Args:
+            name: Metric name
+            help: Description shown in the exposition
+            callback: Function returning the current (labels, value) samples
+            kind: Prometheus metric type, "gauge" or "counter" for values that only grow
+        """
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of the current samples."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._callback():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """An ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        """Add a metric and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registry of the server process, with the phase and HTTP request histograms
+REGISTRY = MetricsRegistry()
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "fusionsim_phase_seconds", "Time spent in each phase of a request", labelnames=("phase",)
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "fusionsim_http_request_duration_seconds", "Time from receiving a request to sending its last byte",
+    labelnames=("method", "route", "status")
+))
+ANIMATION_BYTES = REGISTRY.register(Histogram(
+    "fusionsim_animation_bytes", "Size of the animations returned, by format",
+    labelnames=("format",), buckets=BYTE_BUCKETS
+))
+
+# Phase timings gathered by call_collecting in the current thread
+_collector = threading.local()
+
+
+def record_phase(phase: str, seconds: float, count: int = 1) -> None:
+    """
+    Record the duration of a phase.
+
+    Inside call_collecting() the timing is kept for the caller; otherwise it
+    is observed directly in PHASE_SECONDS.
+
+    Args:
+        phase: One of PHASES
+        seconds: Duration of the phase, or the mean duration when count > 1
+        count: Number of occurrences the duration stands for
+    """
+    timings = getattr(_collector, "timings", None)
+    if timings is not None:
+        timings.append((phase, seconds, count))
+    else:
+        PHASE_SECONDS.observe(seconds, count=count, phase=phase)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Record the duration of a block of code as a phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start)
+
+
+def time_frames(frames: Iterator[np.ndarray], frame_steps: Sequence[int]) -> Iterator[np.ndarray]:
+    """
+    Pass the stored timesteps of a run through, timing how long each takes to compute.
+
+    The time to the initial frame is recorded as "mesh_setup"; the time to
+    each later frame, divided by the number of steps since the previous one,
+    as "solve_step". Time spent by the consumer between frames is not counted.
+
+    Args:
+        frames: Stored timesteps of a run, starting with its initial state
+        frame_steps: Time step reached at each stored frame
+    """
+    iterator = iter(frames)
+    previous_step = 0
+    for index, step in enumerate(frame_steps):
+        start = time.perf_counter()
+        try:
+            frame = next(iterator)
+        except StopIteration:
+            return
+        elapsed = time.perf_counter() - start
+        if index == 0:
+            record_phase("mesh_setup", elapsed)
+        elif step > previous_step:
+            record_phase("solve_step", elapsed / (step - previous_step), count=step - previous_step)
+        previous_step = step
+        yield frame
+    yield from iterator
+
+
+def call_collecting(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, List[PhaseTiming]]:
+    """
+    Call a function and return its result with the phase timings it recorded.
+
+    Used to run work in a worker process, whose own metrics are never rendered.
+    """
+    previous = getattr(_collector, "timings", None)
+    _collector.timings = timings = []
+    try:
+        return func(*args, **kwargs), timings
+    finally:
+        _collector.timings = previous
+
+
+def observe_phases(timings: Iterable[PhaseTiming]) -> None:
+    """Observe phase timings returned by call_collecting in the current process."""
+    for phase, seconds, count in timings:
+        record_phase(phase, seconds, count)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request and the writing of its response.
+
+    Requests are labelled with their route template (e.g. /jobs/{job_id}), so
+    ids do not create new series. The "response_write" phase is the time spent
+    waiting for the response body to be sent, not including the time a
+    streaming response waits for its next chunk.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        write_time = 0.0
+
+        async def timed_send(message: Dict[str, Any]) -> None:
+            nonlocal status, write_time
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                await send(message)
+                return
+            send_start = time.perf_counter()
+            await send(message)
+            write_time += time.perf_counter() - send_start
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status)
+            )
+            record_phase("response_write", write_time)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Format labels as {name="value",...}, escaping the values."""
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects, including +Inf."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
@@ -0,0 +1,304 @@
+"""
+FusionSim Parallel Backend
+--------------------------
+A domain-decomposed version of the NumPy backend's implicit scheme, for 1D
+grids with millions of cells, that runs every time step on several
+processes at once.
+
+The grid is split into contiguous blocks, one per process, and the state
+lives in a shared-memory array. Each backward Euler step solves the
+tridiagonal system (I/dt - coeff·L) u = u_prev/dt - advection with the
+SPIKE algorithm:
+1. Each process solves its block with the couplings to the neighbouring
+   blocks dropped, using a banded LU factorized once, and publishes the
+   first and last values of that partial solution.
+2. The true first and last values of every block follow from a reduced
+   system with 2 unknowns per block. Its matrix is built from the "spikes",
+   the response of each block to its two couplings, and is inverted once;
+   every process applies the inverse to the published values itself.
+3. Each process corrects its block with its spikes and writes the result
+   into the shared state.
+The advection term reads HALO cells of each neighbouring block straight
+from the shared state. The processes meet at a barrier after steps 1 and 3,
+so a time step costs two synchronizations plus O(nx / processes) work, and
+the main process only steps in to collect the stored timesteps.
+
+Results agree with the NumPy backend to within round-off. Only the uniform
+mesh, fixed time steps and non-periodic boundaries are supported. Grids too
+small to give every process MIN_BLOCK_CELLS cells use fewer processes, and
+run on the NumPy backend directly when one block is left.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from numpy_backend import BandedLU, advection_rate, diffusion_bands, initial_condition, iter_numpy_simulation, stored_steps
+from problems import ProblemSpec, get_problem
+
+logger = logging.getLogger("fusionsim")
+
+# Smallest block given to a process; below that the synchronization outweighs the work
+MIN_BLOCK_CELLS = 50_000
+
+# Cells of each neighbouring block read by the advection term
+HALO = 2
+
+# Seconds between two liveness checks of the block processes while waiting for them
+POLL_INTERVAL = 0.1
+
+
+def block_count(nx: int, workers: Optional[int] = None) -> int:
+    """
+    Return how many blocks a grid is split into.
+
+    Args:
+        nx: Number of cells
+        workers: Largest number of processes to use, defaults to the number of CPU cores
+
+    Returns:
+        Number of blocks of at least MIN_BLOCK_CELLS cells, at least 1
+    """
+    workers = workers or os.cpu_count() or 1
+    return max(1, min(workers, nx // MIN_BLOCK_CELLS))
+
+
+def block_bounds(nx: int, blocks: int) -> List[Tuple[int, int]]:
+    """Split nx cells into contiguous blocks of nearly equal size, as (start, stop) pairs."""
+    edges = np.linspace(0, nx, blocks + 1).round().astype(int).tolist()
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def reduced_matrix(spikes: np.ndarray) -> np.ndarray:
+    """
+    Build the reduced system coupling the first and last values of the blocks.
+
+    Args:
+        spikes: Array of shape (blocks, 4) with, per block, the first and last values of
+            its left spike and the first and last values of its right spike
+
+    Returns:
+        Matrix of shape (2 * blocks, 2 * blocks) acting on the first and last values of
+        every block, interleaved
+    """
+    blocks = len(spikes)
+    matrix = np.eye(2 * blocks)
+    for index, (left_first, left_last, right_first, right_last) in enumerate(spikes):
+        # The left spike multiplies the last value of the previous block,
+        # the right spike the first value of the next one
+        if index > 0:
+            matrix[2 * index, 2 * index - 1] = left_first
+            matrix[2 * index + 1, 2 * index - 1] = left_last
+        if index < blocks - 1:
+            matrix[2 * index, 2 * index + 2] = right_first
+            matrix[2 * index + 1, 2 * index + 2] = right_last
+    return matrix
+
+
+def iter_parallel_simulation(
+    simulation_type: Union[str, ProblemSpec],
+    nx: int = 50,
+    dx: float = 1.0,
+    D: Optional[float] = None,
+    k: Optional[float] = None,
+    velocity: Optional[float] = None,
+    steps: int = 100,
+    dt: float = 0.1,
+    store_steps: int = 10,
+    initial_state: Optional[np.ndarray] = None,
+    workers: Optional[int] = None
+) -> Iterator[np.ndarray]:
+    """
+    Run a 1D simulation on several processes, yielding each stored timestep as it is computed.
+
+    Parameters are expected to have been validated by the caller; see
+    diffusion_simulation.run_simulation. The processes are started when the
+    first step is requested and stopped when the run ends or the iterator is
+    closed.
+
+    Args:
+        simulation_type: Type of simulation to run, or the ProblemSpec of one
+        nx, dx, D, k, velocity, steps, dt, store_steps: As for numpy_backend.run_numpy_simulation
+        initial_state: State of shape (nx,) to start from instead of the initial condition
+        workers: Largest number of processes to use, defaults to the number of CPU cores
+
+    Yields:
+        A new array of shape (nx,) for each stored timestep
+
+    Raises:
+        ValueError: If the boundaries are periodic
+        RuntimeError: If the simulation or one of its processes fails
+    """
+    problem = get_problem(simulation_type)
+    if problem.boundary == "periodic":
+        raise ValueError("Periodic boundaries need the fipy backend")
+
+    blocks = block_count(nx, workers)
+    if blocks == 1:
+        yield from iter_numpy_simulation(
+            problem, nx=nx, dx=dx, D=D, k=k, velocity=velocity, steps=steps, dt=dt,
+            store_steps=store_steps, initial_state=initial_state
+        )
+        return
+
+    coeff = {"D": D, "k": k}[problem.diffusivity]
+    values = np.array(initial_state, dtype=float) if initial_state is not None else initial_condition(problem, nx, dx)
+    yield values.copy()
+
+    context = multiprocessing.get_context()
+    shared = {
+        "state": context.RawArray("d", nx),
+        "operator": context.RawArray("d", 3 * nx),
+        "ends": context.RawArray("d", 2 * blocks),
+        "spikes": context.RawArray("d", 4 * blocks),
+        "reduced": context.RawArray("d", 4 * blocks * blocks),
+    }
+    state = np.frombuffer(shared["state"])
+    state[:] = values
+
+    # Backward Euler operator (I/dt - coeff * L), built once for all blocks
+    operator = np.frombuffer(shared["operator"]).reshape(3, nx)
+    operator[:] = -coeff * diffusion_bands(nx, dx, fixed_boundaries=problem.boundary == "dirichlet")
+    operator[1] += 1.0 / dt
+
+    sync = {
+        "go": context.Semaphore(0),
+        "done": context.Semaphore(0),
+        "barrier": context.Barrier(blocks),
+        "command": context.RawValue("q", 0),
+        "errors": context.Queue(),
+    }
+    bounds = block_bounds(nx, blocks)
+    advection_velocity = velocity if problem.advected else None
+    processes = [
+        context.Process(
+            target=_run_block, args=(index, bounds, dx, dt, advection_velocity, shared, sync),
+            name=f"fusionsim-block-{index}", daemon=True
+        )
+        for index in range(blocks)
+    ]
+    logger.debug("Splitting %s cells into %s blocks", nx, blocks)
+
+    try:
+        for process in processes:
+            process.start()
+        _wait_for_blocks(processes, sync, problem.label)
+
+        # The reduced system only depends on the operator, so it is inverted once
+        spikes = np.frombuffer(shared["spikes"]).reshape(blocks, 4)
+        np.frombuffer(shared["reduced"])[:] = np.linalg.inv(reduced_matrix(spikes)).ravel()
+
+        previous = 0
+        for step in stored_steps(steps, store_steps)[1:]:
+            sync["command"].value = step - previous
+            previous = step
+            for _ in processes:
+                sync["go"].release()
+            _wait_for_blocks(processes, sync, problem.label)
+            yield state.copy()
+
+        sync["command"].value = -1
+        for _ in processes:
+            sync["go"].release()
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def _wait_for_blocks(processes: List[Any], sync: Dict[str, Any], label: str) -> None:
+    """
+    Wait until every block process has finished its current command.
+
+    Raises:
+        RuntimeError: If a block process failed or exited
+    """
+    for _ in processes:
+        while not sync["done"].acquire(timeout=POLL_INTERVAL):
+            if all(process.is_alive() for process in processes):
+                continue
+            try:
+                detail = sync["errors"].get(timeout=POLL_INTERVAL)
+            except Exception:
+                detail = "a block process exited unexpectedly"
+            raise RuntimeError(f"Error during {label} simulation: {detail}")
+
+
+def _run_block(
+    index: int,
+    bounds: List[Tuple[int, int]],
+    dx: float,
+    dt: float,
+    velocity: Optional[float],
+    shared: Dict[str, Any],
+    sync: Dict[str, Any]
+) -> None:
+    """
+    Body of a block process: factorize the block, then run the steps it is sent.
+
+    The command value is the number of steps to run next, or -1 to exit. The
+    done semaphore is released once after the setup and after every command.
+    """
+    blocks = len(bounds)
+    nx = bounds[-1][1]
+    start, stop = bounds[index]
+    state = np.frombuffer(shared["state"])
+    operator = np.frombuffer(shared["operator"]).reshape(3, nx)
+    ends = np.frombuffer(shared["ends"]).reshape(blocks, 2)
+    reduced = np.frombuffer(shared["reduced"]).reshape(2 * blocks, 2 * blocks)
+    barrier = sync["barrier"]
+
+    try:
+        lu = BandedLU(operator[:, start:stop].copy())
+
+        # Spikes: the response of the block to a unit value in the last cell of the
+        # previous block and in the first cell of the next one
+        left = np.zeros(stop - start)
+        right = np.zeros(stop - start)
+        if index > 0:
+            left[0] = operator[2, start - 1]
+            left = lu.solve(left)
+        if index < blocks - 1:
+            right[-1] = operator[0, stop]
+            right = lu.solve(right)
+        np.frombuffer(shared["spikes"]).reshape(blocks, 4)[index] = (left[0], left[-1], right[0], right[-1])
+
+        halo_start, halo_stop = max(start - HALO, 0), min(stop + HALO, nx)
+        sync["done"].release()
+
+        while True:
+            sync["go"].acquire()
+            count = sync["command"].value
+            if count < 0:
+                return
+            for _ in range(count):
+                rhs = state[start:stop] / dt
+                if velocity is not None:
+                    rate = advection_rate(state[halo_start:halo_stop], dx, velocity)
+                    rhs -= rate[start - halo_start:stop - halo_start]
+                partial = lu.solve(rhs)
+                ends[index] = (partial[0], partial[-1])
+                # Every block has published its ends and read the state of the previous step
+                barrier.wait()
+
+                interface = (reduced @ ends.ravel()).reshape(blocks, 2)
+                if index > 0:
+                    partial -= left * interface[index - 1, 1]
+                if index < blocks - 1:
+                    partial -= right * interface[index + 1, 0]
+                state[start:stop] = partial
+                # Every block has written its state and read the ends of this step
+                barrier.wait()
+            sync["done"].release()
+    except threading.BrokenBarrierError:
+        # Another block failed and reported it already
+        return
+    except Exception as e:
+        sync["errors"].put(str(e))
+        barrier.abort()
@@ -0,0 +1,241 @@
+"""
+FusionSim Problem Registry
+--------------------------
+Declarative descriptions of the problems the solvers can run.
+
+A problem is a ProblemSpec combining entries of three registries:
+1. EQUATION_TERMS: the terms of the equation, each mapped to the coefficient
+   that scales it. "diffusion" (D·∂²u/∂x², implicit) is always present;
+   "advection" (v·∂u/∂x, evaluated explicitly) is optional.
+2. INITIAL_CONDITIONS: profiles of the initial state, as functions of the
+   distance from the center of the pulse (radial in 2D).
+3. BOUNDARY_CONDITIONS: "neumann" (no flux), "dirichlet" (zero value at the
+   boundary faces) and "periodic".
+
+The simulation types are registered problems. Every backend builds its
+mesh, initial state, operators and boundaries from the spec, so one stepping
+loop per backend serves all of them. The initial condition and boundary
+condition of a simulation type can be overridden per run, and new problems
+can be added with register_problem().
+"""
+
+from typing import Callable, Dict, Optional, Union
+import numpy as np
+
+# Terms an equation can contain, with the coefficients that can scale them
+EQUATION_TERMS = {
+    "diffusion": ("D", "k"),
+    "advection": ("velocity",),
+}
+
+BOUNDARY_CONDITIONS = ("neumann", "dirichlet", "periodic")
+
+# How a missing coefficient is described in error messages
+COEFFICIENT_DESCRIPTIONS = {
+    "D": "Diffusion coefficient (D)",
+    "k": "Thermal conductivity (k)",
+    "velocity": "Velocity",
+}
+
+
+def gaussian_width(dx: float) -> float:
+    """Return w of the "gaussian" profile exp(-d² / w) on a grid of cell size dx."""
+    return dx ** 2 * 10
+
+
+def _gaussian(distance: np.ndarray, length: float, dx: float) -> np.ndarray:
+    """A Gaussian pulse a few cells wide."""
+    return np.exp(-distance ** 2 / gaussian_width(dx))
+
+
+def _top_hat(distance: np.ndarray, length: float, dx: float) -> np.ndarray:
+    """A block of unit height, a tenth of the domain long."""
+    return (np.abs(distance) <= length / 20).astype(float)
+
+
+def _cosine(distance: np.ndarray, length: float, dx: float) -> np.ndarray:
+    """A smooth raised-cosine bump, half the domain long."""
+    half_width = length / 4
+    return np.where(np.abs(distance) < half_width, 0.5 * (1 + np.cos(np.pi * distance / half_width)), 0.0)
+
+
+# Initial condition profiles: (distance from the pulse center, domain length, cell size) -> values
+INITIAL_CONDITIONS: Dict[str, Callable[[np.ndarray, float, float], np.ndarray]] = {
+    "gaussian": _gaussian,
+    "top_hat": _top_hat,
+    "cosine": _cosine,
+}
+
+
+class ProblemSpec:
+    """
+    The equation, initial condition and boundary condition of one problem.
+
+    Specs are shared through PROBLEMS and not changed in place; with_options()
+    returns a modified copy.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        terms: Dict[str, str],
+        initial_condition: str = "gaussian",
+        boundary: str = "neumann",
+        amplitude: float = 1.0,
+        center: float = 0.5,
+        variable: str = "concentration"
+    ):
+        """
+        Args:
+            label: Name of the problem in messages, e.g. "heat equation"
+            terms: Coefficient of each equation term, e.g. {"diffusion": "D"}
+            initial_condition: Name of an INITIAL_CONDITIONS profile
+            boundary: One of BOUNDARY_CONDITIONS
+            amplitude: Peak value of the initial state
+            center: Position of the pulse center in x, as a fraction of the domain length
+            variable: Name of the solved quantity
+
+        Raises:
+            ValueError: If a term, coefficient, profile or boundary condition is unknown,
+                or the diffusion term is missing
+        """
+        if "diffusion" not in terms:
+            raise ValueError("Every problem needs a diffusion term")
+        for term, coefficient in terms.items():
+            if term not in EQUATION_TERMS:
+                raise ValueError(f"Unknown equation term: {term}")
+            if coefficient not in EQUATION_TERMS[term]:
+                raise ValueError(f"The {term} term cannot be scaled by {coefficient}")
+        if initial_condition not in INITIAL_CONDITIONS:
+            raise ValueError(f"Unknown initial condition: {initial_condition}")
+        if boundary not in BOUNDARY_CONDITIONS:
+            raise ValueError(f"Unknown boundary condition: {boundary}")
+
+        self.label = label
+        self.terms = dict(terms)
+        self.initial_condition = initial_condition
+        self.boundary = boundary
+        self.amplitude = float(amplitude)
+        self.center = float(center)
+        self.variable = variable
+
+    def with_options(self, initial_condition: Optional[str] = None, boundary: Optional[str] = None) -> "ProblemSpec":
+        """Return a copy with another initial condition and/or boundary condition."""
+        return ProblemSpec(
+            self.label, self.terms,
+            initial_condition=initial_condition or self.initial_condition,
+            boundary=boundary or self.boundary,
+            amplitude=self.amplitude, center=self.center, variable=self.variable
+        )
+
+    @property
+    def diffusivity(self) -> str:
+        """Name of the coefficient of the diffusion term."""
+        return self.terms["diffusion"]
+
+    @property
+    def advected(self) -> bool:
+        """Whether the equation has an advection term."""
+        return "advection" in self.terms
+
+    def coefficients(self, D: Optional[float] = None, k: Optional[float] = None, velocity: Optional[float] = None) -> Dict[str, float]:
+        """
+        Pick out the coefficients used by the equation, checking that they are provided.
+
+        Raises:
+            ValueError: If a required coefficient is missing
+        """
+        given = {"D": D, "k": k, "velocity": velocity}
+        required = {}
+        for coefficient in self.terms.values():
+            if given[coefficient] is None:
+                raise ValueError(
+                    f"{COEFFICIENT_DESCRIPTIONS[coefficient]} must be provided for {self.label} simulation"
+                )
+            required[coefficient] = given[coefficient]
+        return required
+
+    def initial_values(
+        self,
+        x: np.ndarray,
+        nx: int,
+        dx: float,
+        y: Optional[np.ndarray] = None,
+        ny: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Evaluate the initial condition.
+
+        The pulse is defined by the uniform grid (its position and size scale
+        with nx and dx), but can be evaluated at any positions, e.g. the cell
+        centers of a non-uniform mesh covering the same domain. With y and ny
+        the pulse is also centered in y and the profile is radial.
+
+        Args:
+            x: x coordinates to evaluate at
+            nx: Number of cells of the uniform grid in x
+            dx: Cell size
+            y: y coordinates of the same points, for a 2D grid
+            ny: Number of cells in y
+
+        Returns:
+            Array with the initial values at each position
+        """
+        length = nx * dx
+        distance = np.asarray(x, dtype=float) - self.center * length
+        if y is not None:
+            distance = np.hypot(distance, np.asarray(y, dtype=float) - ny * dx / 2)
+        return self.amplitude * INITIAL_CONDITIONS[self.initial_condition](distance, length, dx)
+
+
+PROBLEMS: Dict[str, ProblemSpec] = {
+    # ∂u/∂t = D·∂²u/∂x², no-flux boundaries
+    "diffusion": ProblemSpec("diffusion", {"diffusion": "D"}),
+    # ∂T/∂t = k·∂²T/∂x², edges held at zero
+    "heat": ProblemSpec(
+        "heat equation", {"diffusion": "k"}, boundary="dirichlet", amplitude=100.0, variable="temperature"
+    ),
+    # ∂u/∂t + v·∂u/∂x = D·∂²u/∂x², pulse left of center so it has room to move
+    "advection_diffusion": ProblemSpec(
+        "advection-diffusion", {"diffusion": "D", "advection": "velocity"}, center=0.25
+    ),
+}
+
+
+def register_problem(name: str, spec: ProblemSpec) -> None:
+    """
+    Register a problem under a name, usable as a simulation type.
+
+    Raises:
+        ValueError: If the name is already taken
+    """
+    if name in PROBLEMS:
+        raise ValueError(f"Problem {name} is already registered")
+    PROBLEMS[name] = spec
+
+
+def get_problem(
+    problem: Union[str, ProblemSpec],
+    initial_condition: Optional[str] = None,
+    boundary: Optional[str] = None
+) -> ProblemSpec:
+    """
+    Look up a problem by simulation type, optionally overriding its initial and boundary conditions.
+
+    Args:
+        problem: Simulation type, or a spec which is returned (with the overrides applied)
+        initial_condition: Name of an INITIAL_CONDITIONS profile to use instead of the default
+        boundary: Boundary condition to use instead of the default
+
+    Raises:
+        ValueError: If the simulation type, profile or boundary condition is unknown
+    """
+    if isinstance(problem, ProblemSpec):
+        spec = problem
+    elif problem in PROBLEMS:
+        spec = PROBLEMS[problem]
+    else:
+        raise ValueError(f"Unknown simulation type: {problem}")
+    if initial_condition is None and boundary is None:
+        return spec
+    return spec.with_options(initial_condition=initial_condition, boundary=boundary)
@@ -0,0 +1,243 @@
+"""
+FusionSim Profiler
+------------------
+A low-overhead sampling profiler for individual requests.
+
+While a profiled call runs, a background thread records the call stack of
+the calling thread every SAMPLE_INTERVAL seconds. Identical stacks are
+counted rather than stored, so a profile stays small however long the call
+runs. Nothing is installed in the interpreter (no sys.setprofile hook), so
+calls that are not profiled pay nothing, and profiled ones only pay for the
+sampling thread.
+
+Profiles are stored as JSON records in a directory, one per request, and can
+be exported as:
+1. "collapsed": one "root;caller;callee count" line per stack, the input of
+   flamegraph.pl and most flame graph tools
+2. "speedscope": a sampled profile in the speedscope file format
+   (https://www.speedscope.app)
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+# Seconds between two samples
+SAMPLE_INTERVAL = 0.002
+
+# Export formats of a stored profile
+ProfileFormat = Literal["speedscope", "collapsed"]
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+# Profile ids are generated by save_profile; anything else is rejected before touching the disk
+_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ProfileNotFoundError(KeyError):
+    """Raised when no stored profile has the requested id."""
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread from a background thread."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, thread_id: Optional[int] = None, root: Optional[Any] = None):
+        """
+        Args:
+            interval: Seconds between samples
+            thread_id: Thread to sample, defaults to the thread creating the profiler
+            root: Frame at which stacks are cut off, so the callers of the
+                profiled code are left out of every sample
+        """
+        if interval <= 0:
+            raise ValueError(f"Sampling interval must be positive, got {interval}")
+
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.root = root
+        self.stacks: Counter = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_time = 0.0
+
+    def start(self) -> None:
+        """Start sampling in a daemon thread."""
+        self._stop.clear()
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="fusionsim-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampling thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.perf_counter() - self._start_time
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and frame is not self.root:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+def profile_call(
+    func: Callable[..., Any],
+    args: Tuple[Any, ...] = (),
+    kwargs: Optional[Dict[str, Any]] = None,
+    interval: float = SAMPLE_INTERVAL
+) -> Tuple[Any, Dict[str, int]]:
+    """
+    Call a function under the sampling profiler.
+
+    Meant to be run in a worker process: the samples are returned with the
+    result so the caller can store them.
+
+    Returns:
+        Tuple of the result and the sampled stacks, as collapsed stack strings
+        mapped to their number of samples
+    """
+    with SamplingProfiler(interval, root=sys._getframe()) as profiler:
+        result = func(*args, **(kwargs or {}))
+    return result, dict(profiler.stacks)
+
+
+def save_profile(directory: str, stacks: Dict[str, int], interval: float, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Store the samples of a request as a new profile.
+
+    Args:
+        directory: Directory of the profile store
+        stacks: Collapsed stack strings mapped to their number of samples
+        interval: Sampling interval the stacks were recorded with
+        metadata: Description of the profiled request
+
+    Returns:
+        The id of the stored profile
+
+    Raises:
+        OSError: If the profile cannot be written
+    """
+    os.makedirs(directory, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    record = {
+        "id": profile_id,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "interval": interval,
+        "samples": sum(stacks.values()),
+        "metadata": metadata or {},
+        "stacks": stacks,
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f, default=str)
+        os.replace(tmp_path, _profile_path(directory, profile_id))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return profile_id
+
+
+def load_profile(directory: str, profile_id: str) -> Dict[str, Any]:
+    """
+    Read a stored profile.
+
+    Raises:
+        ProfileNotFoundError: If there is no profile with this id
+    """
+    if not _ID_PATTERN.match(profile_id):
+        raise ProfileNotFoundError(profile_id)
+    try:
+        with open(_profile_path(directory, profile_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ProfileNotFoundError(profile_id) from None
+
+
+def list_profiles(directory: str) -> List[Dict[str, Any]]:
+    """Return the id, creation time, sample count and metadata of every stored profile, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        profile_id, extension = os.path.splitext(name)
+        if extension != ".json" or not _ID_PATTERN.match(profile_id):
+            continue
+        try:
+            record = load_profile(directory, profile_id)
+        except (ProfileNotFoundError, ValueError):
+            continue
+        profiles.append({key: record[key] for key in ("id", "created", "samples", "metadata")})
+    return sorted(profiles, key=lambda profile: profile["created"], reverse=True)
+
+
+def to_collapsed(profile: Dict[str, Any]) -> str:
+    """Export a profile in the collapsed stack format, heaviest stacks first."""
+    stacks = sorted(profile["stacks"].items(), key=lambda item: item[1], reverse=True)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+def to_speedscope(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Export a profile as a sampled profile in the speedscope file format."""
+    frames: List[Dict[str, str]] = []
+    frame_index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in profile["stacks"].items():
+        indices = []
+        for name in stack.split(";"):
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indices.append(frame_index[name])
+        samples.append(indices)
+        weights.append(count * profile["interval"])
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"FusionSim profile {profile['id']}",
+        "exporter": "fusionsim",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": profile["id"],
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def _frame_name(frame: Any) -> str:
+    """Name a stack frame by function, file and first line, so all samples of a function share a name."""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _profile_path(directory: str, profile_id: str) -> str:
+    return os.path.join(directory, f"{profile_id}.json")
@@ -0,0 +1,174 @@
+"""
+FusionSim Rate Limiting
+-----------------------
+Per-client limits on the simulation work requested from the server.
+
+Every request is given a cost by estimate_cost(): the cell updates of the
+solve (cells × steps, or cells × frames for the analytic backend, which does
+not step), times the processes the solve runs on, plus a fixed cost per
+rendered frame. The cost is used three ways:
+1. Requests costing more than a configured budget are rejected up front with
+   CostLimitError, before any work is queued. Background jobs have a larger
+   budget of their own.
+2. Each client has a token bucket that holds up to ``burst`` cost units and
+   refills at ``rate`` units per second. A request takes its cost from the
+   bucket, or is rejected with RateLimitedError and the time until enough
+   tokens are back.
+3. Requests above a "heavy" threshold take one of a few heavy slots of the
+   worker pool (see worker_pool.WorkerPool), so small interactive requests
+   always find a free worker while heavy ones run.
+
+Requests served from the result cache (either tier) or coalesced with an
+identical one in flight cost nothing; callers only charge the bucket for the
+work that will be done, e.g. only the rendering of an animation whose
+results are already cached.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Cost of rendering one animation frame, in cell updates
+FRAME_COST = 100_000
+
+# Number of client buckets kept; the least recently used is dropped beyond that
+MAX_CLIENTS = 10_000
+
+
+class CostLimitError(ValueError):
+    """Raised when a single request costs more than the configured budget."""
+
+    def __init__(self, cost: int, budget: int, job: bool = False):
+        super().__init__(
+            f"{'Job' if job else 'Request'} cost {cost} exceeds the budget of {budget} cell updates; "
+            f"reduce nx, steps or store_frames{'' if job else ', or submit it as a job'}"
+        )
+        self.cost = cost
+        self.budget = budget
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when a client has used up its token bucket."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many simulation requests from this client")
+        self.retry_after = retry_after
+
+
+def estimate_cost(
+    nx: int,
+    steps: int,
+    frames: int,
+    ny: Optional[int] = None,
+    cells: Optional[int] = None,
+    backend: str = "fipy",
+    render: bool = True,
+    processes: int = 1,
+    solve: bool = True
+) -> int:
+    """
+    Estimate the work of a simulation request in cell updates.
+
+    Args:
+        nx: Number of cells of the uniform grid in x
+        steps: Number of time steps
+        frames: Number of stored frames
+        ny: Number of cells in y of a 2D simulation
+        cells: Number of cells of a graded or adaptive mesh, used instead of nx
+        backend: Simulation backend; "analytic" evaluates each frame without stepping
+        render: Whether the frames are rendered into an animation
+        processes: Number of processes the solve keeps busy, e.g. the blocks of the parallel backend
+        solve: Whether the simulation is run, False when only cached results are rendered
+
+    Returns:
+        Estimated cost of the request
+    """
+    grid = (cells or nx) * (ny or 1)
+    solve_cost = grid * (frames if backend == "analytic" else steps) * processes if solve else 0
+    return solve_cost + (frames * FRAME_COST if render else 0)
+
+
+class RateLimiter:
+    """
+    Token buckets per client, weighted by request cost.
+
+    Meant to be called from the event loop thread only, so it takes no locks.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_cost: int,
+        max_job_cost: int = 0,
+        max_clients: int = MAX_CLIENTS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            rate: Cost units added to every bucket per second; 0 disables the buckets
+            burst: Capacity of a bucket; raised to max_cost so every admissible request can pass
+            max_cost: Largest cost of a single request; 0 disables the budget
+            max_job_cost: Largest cost of a single background job; 0 disables the budget
+            max_clients: Number of client buckets kept
+            clock: Source of the current time in seconds
+        """
+        if rate < 0 or burst < 0 or max_cost < 0 or max_job_cost < 0:
+            raise ValueError("rate, burst, max_cost and max_job_cost cannot be negative")
+
+        self.rate = rate
+        self.max_cost = max_cost
+        self.max_job_cost = max_job_cost
+        self.burst = max(burst, max_cost)
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._rejected = {"cost": 0, "rate": 0}
+
+    def check_cost(self, cost: int, job: bool = False) -> None:
+        """
+        Reject a request that would exceed the per-request budget.
+
+        Args:
+            cost: Estimated cost of the request
+            job: Whether the request is a background job, checked against max_job_cost
+
+        Raises:
+            CostLimitError: If the cost is above max_cost, or max_job_cost for a job
+        """
+        budget = self.max_job_cost if job else self.max_cost
+        if budget and cost > budget:
+            self._rejected["cost"] += 1
+            raise CostLimitError(cost, budget, job=job)
+
+    def charge(self, client: str, cost: int) -> None:
+        """
+        Take the cost of a request from the bucket of a client.
+
+        A cost above the bucket capacity, e.g. that of a large job, takes a full bucket.
+
+        Raises:
+            RateLimitedError: If the bucket holds fewer tokens than the cost
+        """
+        if not self.rate:
+            return
+        now = self._clock()
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        cost = min(cost, self.burst)
+        if tokens < cost:
+            self._store(client, tokens, now)
+            self._rejected["rate"] += 1
+            raise RateLimitedError(max(1, math.ceil((cost - tokens) / self.rate)))
+        self._store(client, tokens - cost, now)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of tracked clients and of rejected requests by reason."""
+        return {"clients": len(self._buckets), "rejected_cost": self._rejected["cost"], "rejected_rate": self._rejected["rate"]}
+
+    def _store(self, client: str, tokens: float, now: float) -> None:
+        self._buckets[client] = (tokens, now)
+        # A dropped bucket has been idle the longest, so it would be nearly full anyway
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
@@ -0,0 +1,255 @@
+"""
+FusionSim Result Cache
+----------------------
+A content-addressed cache for simulation results and rendered animations.
+
+Entries are keyed on a hash of the canonicalized request parameters and kept
+in two tiers:
+1. An in-memory LRU bounded by the total size of the cached values in bytes
+2. An optional on-disk store that survives restarts
+
+Values are either NumPy arrays (stored on disk as .npy) or raw bytes. Each
+namespace ("results", "animations", ...) keeps its own hit/miss counters.
+Concurrent requests for the same key are coalesced: only the first computes,
+the others await its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict, defaultdict
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger("fusionsim")
+
+CachedValue = Union[np.ndarray, bytes]
+
+# Bump when the meaning of cached values changes, to invalidate old disk entries
+CACHE_VERSION = 2
+
+
+def make_key(namespace: str, **params: Any) -> str:
+    """
+    Build a content-addressed key from request parameters.
+
+    Parameters are serialized as JSON with sorted keys, so the key does not
+    depend on argument order. Enum members are reduced to their values.
+    """
+    canonical = {
+        name: getattr(value, "value", value)
+        for name, value in params.items()
+    }
+    payload = json.dumps(
+        {"version": CACHE_VERSION, "namespace": namespace, "params": canonical},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache with request coalescing.
+
+    Memory operations are meant to be called from the event loop thread; disk
+    reads and writes are run in a thread so they do not block it.
+    """
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        """
+        Args:
+            max_bytes: Maximum total size of the values kept in memory
+            directory: Directory of the on-disk store, or None for memory only
+        """
+        if max_bytes < 0:
+            raise ValueError(f"max_bytes cannot be negative, got {max_bytes}")
+
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries: "OrderedDict[Tuple[str, str], CachedValue]" = OrderedDict()
+        self._size = 0
+        self._in_flight: Dict[Tuple[str, str], "asyncio.Future[CachedValue]"] = {}
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+        )
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        key: str,
+        compute: Callable[[], Awaitable[CachedValue]]
+    ) -> CachedValue:
+        """
+        Return the cached value for a key, computing and storing it on a miss.
+
+        If the same key is already being computed, wait for that computation
+        instead of starting another one. Failures are propagated to every
+        waiter and are not cached.
+        """
+        counters = self._counters[namespace]
+        entry_id = (namespace, key)
+
+        value = self._get_memory(entry_id)
+        if value is not None:
+            counters["hits"] += 1
+            return value
+
+        pending = self._in_flight.get(entry_id)
+        if pending is not None:
+            counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request we were waiting on went away; compute it ourselves
+                return await self.get_or_compute(namespace, key, compute)
+
+        future: "asyncio.Future[CachedValue]" = asyncio.get_running_loop().create_future()
+        self._in_flight[entry_id] = future
+        try:
+            value = await self._load_disk(namespace, key)
+            if value is not None:
+                counters["disk_hits"] += 1
+            else:
+                counters["misses"] += 1
+                value = await compute()
+                if isinstance(value, np.ndarray):
+                    value.flags.writeable = False
+                await self._store_disk(namespace, key, value)
+            self._put_memory(entry_id, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[entry_id]
+
+    def contains(self, namespace: str, key: str) -> bool:
+        """
+        Whether a key is cached in either tier or being computed, i.e. can be returned without new work.
+
+        The disk tier is checked with a stat of the entry's files, which is cheap
+        enough to do on the event loop thread.
+        """
+        entry_id = (namespace, key)
+        if entry_id in self._entries or entry_id in self._in_flight:
+            return True
+        return self.directory is not None and any(
+            os.path.exists(self._entry_path(namespace, key, suffix)) for suffix in (".npy", ".bin")
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters per namespace and the memory tier usage."""
+        namespaces = {}
+        for namespace, counters in self._counters.items():
+            lookups = counters["hits"] + counters["disk_hits"] + counters["misses"] + counters["coalesced"]
+            namespaces[namespace] = {
+                **counters,
+                "hit_rate": (lookups - counters["misses"]) / lookups if lookups else 0.0
+            }
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "disk_enabled": self.directory is not None,
+            "namespaces": namespaces
+        }
+
+    def clear(self) -> None:
+        """Drop every entry from the memory tier."""
+        self._entries.clear()
+        self._size = 0
+
+    def _get_memory(self, entry_id: Tuple[str, str]) -> Optional[CachedValue]:
+        value = self._entries.get(entry_id)
+        if value is not None:
+            self._entries.move_to_end(entry_id)
+        return value
+
+    def _put_memory(self, entry_id: Tuple[str, str], value: CachedValue) -> None:
+        size = _value_size(value)
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(entry_id, None)
+        if previous is not None:
+            self._size -= _value_size(previous)
+        self._entries[entry_id] = value
+        self._size += size
+
+        # Evict least recently used entries until the memory tier fits again
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= _value_size(evicted)
+
+    async def _load_disk(self, namespace: str, key: str) -> Optional[CachedValue]:
+        if self.directory is None:
+            return None
+        return await asyncio.to_thread(self._read_file, namespace, key)
+
+    async def _store_disk(self, namespace: str, key: str, value: CachedValue) -> None:
+        if self.directory is None:
+            return
+        try:
+            await asyncio.to_thread(self._write_file, namespace, key, value)
+        except OSError as e:
+            # The disk tier is best effort; a failed write only costs a future miss
+            logger.warning("Could not write cache entry %s/%s: %s", namespace, key, e)
+
+    def _entry_path(self, namespace: str, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, namespace, key[:2], key + suffix)
+
+    def _read_file(self, namespace: str, key: str) -> Optional[CachedValue]:
+        array_path = self._entry_path(namespace, key, ".npy")
+        if os.path.exists(array_path):
+            value = np.load(array_path, allow_pickle=False)
+            value.flags.writeable = False
+            return value
+        bytes_path = self._entry_path(namespace, key, ".bin")
+        if os.path.exists(bytes_path):
+            with open(bytes_path, "rb") as f:
+                return f.read()
+        return None
+
+    def _write_file(self, namespace: str, key: str, value: CachedValue) -> None:
+        if isinstance(value, np.ndarray):
+            path = self._entry_path(namespace, key, ".npy")
+            buffer = BytesIO()
+            np.save(buffer, value, allow_pickle=False)
+            data = buffer.getvalue()
+        else:
+            path = self._entry_path(namespace, key, ".bin")
+            data = bytes(value)
+
+        # Write to a temporary file first so readers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _value_size(value: CachedValue) -> int:
+    """Return the size in bytes of a cached value."""
+    return value.nbytes if isinstance(value, np.ndarray) else len(value)
@@ -0,0 +1,154 @@
+"""
+FusionSim Result Formats
+------------------------
+Encoders that return simulation results as compact binary payloads instead
+of rendered animations.
+
+Results are a contiguous (frames, nx) array, or (frames, ny, nx) for a 2D
+simulation, in one of two layouts:
+1. "npy": a NumPy .npy file, readable with numpy.load
+2. "f32": a fixed 24-byte header followed by raw little-endian float32 values
+
+Either layout can be compressed with gzip, or with zstd when the optional
+zstandard package is installed.
+
+The f32 header is packed as ``<4sHHIId``: the magic bytes b"FSIM", the format
+version, a reserved field, the number of frames, the number of cells and the
+cell size dx. 2D results use format version 2, where the reserved field holds
+ny and the number of cells is nx.
+"""
+
+import gzip
+import struct
+from io import BytesIO
+from typing import Literal, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for zstd compression
+    zstandard = None
+
+ResultFormat = Literal["npy", "f32"]
+RESULT_FORMATS = ("npy", "f32")
+
+Compression = Literal["none", "gzip", "zstd"]
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+F32_MAGIC = b"FSIM"
+F32_VERSION = 1
+F32_VERSION_2D = 2
+F32_HEADER = struct.Struct("<4sHHIId")
+
+# Favour speed: the payload is produced per request
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_MEDIA_TYPES = {"none": "application/octet-stream", "gzip": "application/gzip", "zstd": "application/zstd"}
+_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def downsample(results: np.ndarray, dx: float, frame_step: int = 1, cell_step: int = 1) -> Tuple[np.ndarray, float]:
+    """
+    Keep every ``frame_step``-th frame and every ``cell_step``-th cell along each axis.
+
+    The final frame is always kept so the end state of the run is never lost.
+
+    Args:
+        results: Array of shape (frames, nx) or (frames, ny, nx)
+        dx: Cell size of the full-resolution mesh
+        frame_step: Stride between kept frames
+        cell_step: Stride between kept cells
+
+    Returns:
+        Tuple of the downsampled contiguous array and its cell size
+
+    Raises:
+        ValueError: If a stride is not positive
+    """
+    if frame_step < 1 or cell_step < 1:
+        raise ValueError(f"Downsampling strides must be positive, got frame_step={frame_step}, cell_step={cell_step}")
+
+    frame_indices = np.arange(0, results.shape[0], frame_step)
+    if frame_indices[-1] != results.shape[0] - 1:
+        frame_indices = np.append(frame_indices, results.shape[0] - 1)
+    cells = (slice(None, None, cell_step),) * (results.ndim - 1)
+    return np.ascontiguousarray(results[(frame_indices,) + cells]), dx * cell_step
+
+
+def encode_results(
+    results: np.ndarray,
+    dx: float,
+    fmt: ResultFormat = "npy",
+    compression: Compression = "none"
+) -> Tuple[bytes, str, str]:
+    """
+    Serialize a (frames, nx) or (frames, ny, nx) results array.
+
+    Args:
+        results: Array of shape (frames, nx) or (frames, ny, nx)
+        dx: Cell size, recorded in the f32 header
+        fmt: Layout of the payload, "npy" or "f32"
+        compression: "none", "gzip" or "zstd"
+
+    Returns:
+        Tuple of the payload, its media type and a suggested file name
+
+    Raises:
+        ValueError: If the format or compression is unknown, zstd is unavailable, or
+            ny does not fit the f32 header
+    """
+    if fmt not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+
+    if fmt == "npy":
+        buffer = BytesIO()
+        np.save(buffer, results, allow_pickle=False)
+        payload = buffer.getvalue()
+        media_type = "application/x-npy"
+    else:
+        if results.ndim == 3:
+            frames, ny, nx = results.shape
+            if ny > 0xFFFF:
+                raise ValueError(f"The f32 format supports at most 65535 cells in y, got {ny}")
+            header = F32_HEADER.pack(F32_MAGIC, F32_VERSION_2D, ny, frames, nx, dx)
+        else:
+            frames, nx = results.shape
+            header = F32_HEADER.pack(F32_MAGIC, F32_VERSION, 0, frames, nx, dx)
+        payload = header + np.ascontiguousarray(results, dtype="<f4").tobytes()
+        media_type = "application/octet-stream"
+
+    if compression == "gzip":
+        # mtime=0 keeps the payload identical for identical results
+        payload = gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == "zstd":
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    if compression != "none":
+        media_type = _MEDIA_TYPES[compression]
+
+    return payload, media_type, f"results.{fmt}{_SUFFIXES[compression]}"
+
+
+def decode_f32(payload: bytes) -> Tuple[np.ndarray, float]:
+    """
+    Read an uncompressed "f32" payload back into an array.
+
+    Returns:
+        Tuple of the (frames, nx) or (frames, ny, nx) float32 array and the cell size
+
+    Raises:
+        ValueError: If the payload is not a supported f32 payload
+    """
+    if len(payload) < F32_HEADER.size:
+        raise ValueError("Payload is shorter than the f32 header")
+    magic, version, ny, frames, nx, dx = F32_HEADER.unpack_from(payload)
+    if magic != F32_MAGIC or version not in (F32_VERSION, F32_VERSION_2D):
+        raise ValueError("Payload is not a FusionSim f32 payload")
+    shape = (frames, ny, nx) if version == F32_VERSION_2D else (frames, nx)
+    values = np.frombuffer(payload, dtype="<f4", count=int(np.prod(shape)), offset=F32_HEADER.size)
+    return values.reshape(shape), dx
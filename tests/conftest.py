@@ -0,0 +1,30 @@
+"""Make the FusionSim modules at the repository root importable from the tests."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the API tests from warming up every worker and from writing the server log
+os.environ.setdefault("FUSIONSIM_WARMUP", "0")
+os.environ.setdefault("FUSIONSIM_LOG_FILE", "none")
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """A test client of the API with an empty job store and result cache, and no rate limits."""
+    from fastapi.testclient import TestClient
+
+    import config
+    import main
+    from rate_limit import RateLimiter
+    from result_cache import ResultCache
+
+    monkeypatch.setattr(main.job_manager, "directory", str(tmp_path / "jobs"))
+    monkeypatch.setattr(main.job_manager, "_jobs", {})
+    monkeypatch.setattr(main, "result_cache", ResultCache(max_bytes=config.CACHE_MAX_BYTES))
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(rate=0, burst=0, max_cost=0))
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,100 @@
+"""
+Tests of the closed-form solutions of the analytic backend.
+
+The closed form is checked against its definition and against the numpy
+backend, and the deviation is checked on the API, where it is opt-in.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+import main
+from analytic import (
+    BOUNDARY_TOLERANCE, analytic_applicable, analytic_deviation, check_applicable, iter_analytic_simulation
+)
+from numpy_backend import cell_centers, initial_condition
+from problems import gaussian_width, get_problem
+
+CASES = {
+    "diffusion": {"D": 1.0},
+    "heat": {"k": 0.5},
+}
+
+
+@pytest.mark.parametrize("simulation_type, coefficients", CASES.items())
+def test_starts_from_the_initial_condition(simulation_type, coefficients):
+    first = next(iter_analytic_simulation(simulation_type, nx=100, steps=10, dt=0.1, store_steps=2, **coefficients))
+    np.testing.assert_allclose(first, initial_condition(simulation_type, 100, 1.0), rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.parametrize("simulation_type, coefficients", CASES.items())
+def test_matches_the_closed_form(simulation_type, coefficients):
+    nx, dx, steps, dt = 100, 0.5, 40, 0.05
+    diffusivity = next(iter(coefficients.values()))
+    frames = list(iter_analytic_simulation(
+        simulation_type, nx=nx, dx=dx, steps=steps, dt=dt, store_steps=1, **coefficients
+    ))
+
+    x = cell_centers(nx, dx)
+    width = gaussian_width(dx)
+    spread = width + 4 * diffusivity * steps * dt
+    amplitude = get_problem(simulation_type).amplitude
+    expected = amplitude * math.sqrt(width / spread) * np.exp(-((x - nx * dx / 2) ** 2) / spread)
+    np.testing.assert_allclose(frames[-1], expected, rtol=1e-12, atol=1e-15)
+    # Away from the boundaries the pulse keeps its mass
+    assert frames[-1].sum() == pytest.approx(frames[0].sum(), rel=1e-6)
+
+
+def test_applicable_while_the_pulse_is_away_from_the_boundaries():
+    assert analytic_applicable("diffusion", nx=100, dx=1.0, steps=100, dt=0.1, D=1.0)
+    assert not analytic_applicable("diffusion", nx=100, dx=1.0, steps=100_000, dt=0.1, D=1.0)
+
+    # The limit is reached where the pulse is BOUNDARY_TOLERANCE of its peak at the boundaries
+    nx, dx, dt = 100, 1.0, 0.1
+    limit = ((nx * dx / 2) ** 2 / math.log(1 / BOUNDARY_TOLERANCE) - gaussian_width(dx)) / (4 * dt)
+    assert analytic_applicable("diffusion", nx, dx, math.floor(limit), dt, D=1.0)
+    assert not analytic_applicable("diffusion", nx, dx, math.ceil(limit) + 1, dt, D=1.0)
+
+    with pytest.raises(ValueError, match="stay away from the boundaries"):
+        check_applicable("diffusion", nx, dx, math.ceil(limit) + 1, dt, D=1.0)
+
+
+def test_applicable_rejects_problems_without_a_closed_form():
+    with pytest.raises(ValueError, match="advection term"):
+        analytic_applicable("advection_diffusion", nx=100, dx=1.0, steps=10, dt=0.1, D=1.0, velocity=1.0)
+    with pytest.raises(ValueError):
+        analytic_applicable("diffusion", nx=100, dx=1.0, steps=10, dt=0.1)
+
+
+@pytest.mark.parametrize("simulation_type, coefficients", CASES.items())
+def test_deviation_of_the_numpy_backend(simulation_type, coefficients):
+    deviation = analytic_deviation(simulation_type, nx=100, steps=20, dt=0.05, store_steps=5, **coefficients)
+    assert 0 < deviation < 1e-2
+
+
+ANALYTIC_RUN = {"simulation_type": "diffusion", "nx": 100, "steps": 20, "dt": 0.05, "store_frames": 5, "backend": "analytic"}
+
+
+def test_data_returns_the_deviation_on_request(client):
+    response = client.post("/diffusion/data", json=ANALYTIC_RUN)
+    assert response.status_code == 200
+    assert main.DEVIATION_HEADER not in response.headers
+
+    response = client.post("/diffusion/data", params={"deviation": True}, json=ANALYTIC_RUN)
+    assert response.status_code == 200
+    expected = analytic_deviation("diffusion", nx=100, steps=20, dt=0.05, store_steps=5, D=1.0)
+    assert float(response.headers[main.DEVIATION_HEADER]) == pytest.approx(expected, rel=1e-5)
+
+
+def test_animation_returns_the_deviation_on_request(client):
+    response = client.post("/diffusion", params={"deviation": True, "format": "json"}, json=ANALYTIC_RUN)
+    assert response.status_code == 200
+    assert float(response.headers[main.DEVIATION_HEADER]) > 0
+
+
+@pytest.mark.parametrize("path", ["/diffusion", "/diffusion/data"])
+def test_deviation_needs_the_analytic_backend(client, path):
+    response = client.post(path, params={"deviation": True}, json={**ANALYTIC_RUN, "backend": "numpy"})
+    assert response.status_code == 400
@@ -0,0 +1,110 @@
+"""Tests of the cost limits and the heavy lane on the API endpoints."""
+
+import pytest
+
+import config
+import main
+from rate_limit import RateLimiter
+from result_cache import ResultCache
+
+SMALL_RUN = {"simulation_type": "diffusion", "nx": 20, "steps": 10, "store_frames": 2, "backend": "numpy"}
+
+
+def limit(monkeypatch, **kwargs):
+    """Replace the rate limiter of the app."""
+    limiter = RateLimiter(**kwargs)
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+    return limiter
+
+
+def test_data_over_budget_is_rejected(client, monkeypatch):
+    limit(monkeypatch, rate=0, burst=0, max_cost=100)
+    response = client.post("/diffusion/data", json=SMALL_RUN)
+    assert response.status_code == 413
+    assert "submit it as a job" in response.json()["detail"]
+
+
+def test_data_rate_limited_until_cached(client, monkeypatch):
+    cost = main._request_cost(main.SimulationParams(**SMALL_RUN), render=False)
+    limit(monkeypatch, rate=1, burst=cost, max_cost=cost)
+    assert client.post("/diffusion/data", json=SMALL_RUN).status_code == 200
+
+    # The same request is answered from the cache and costs nothing
+    assert client.post("/diffusion/data", json=SMALL_RUN).status_code == 200
+
+    response = client.post("/diffusion/data", json={**SMALL_RUN, "D": 2.0})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_disk_cache_hits_are_free(client, monkeypatch, tmp_path):
+    cache = ResultCache(max_bytes=config.CACHE_MAX_BYTES, directory=str(tmp_path / "cache"))
+    monkeypatch.setattr(main, "result_cache", cache)
+    cost = main._request_cost(main.SimulationParams(**SMALL_RUN), render=False)
+    limit(monkeypatch, rate=1, burst=cost, max_cost=cost)
+    assert client.post("/diffusion/data", json=SMALL_RUN).status_code == 200
+
+    # Only the disk tier still holds the results
+    cache.clear()
+    assert client.post("/diffusion/data", json=SMALL_RUN).status_code == 200
+
+
+def test_animations_of_cached_results_only_cost_the_rendering(client, monkeypatch):
+    params = main.SimulationParams(**SMALL_RUN)
+    solve_cost = main._request_cost(params, render=False)
+    render_cost = main._request_cost(params, render=True, solve=False)
+    limit(monkeypatch, rate=1, burst=solve_cost + render_cost, max_cost=solve_cost + render_cost)
+    assert client.post("/diffusion/data", json=SMALL_RUN).status_code == 200
+    assert client.post("/diffusion", json=SMALL_RUN).status_code == 200
+
+    response = client.post("/diffusion", json={**SMALL_RUN, "D": 2.0})
+    assert response.status_code == 429
+
+
+def test_batch_costs_the_sum_of_its_runs(client, monkeypatch):
+    batch = {"nx": 20, "steps": 10, "store_frames": 2, "runs": [{"D": 1.0}, {"D": 2.0}]}
+    single = main._batch_cost(main.BatchSimulationParams(**{**batch, "runs": batch["runs"][:1]}))
+    limit(monkeypatch, rate=0, burst=0, max_cost=single)
+    assert client.post("/diffusion/batch", json={**batch, "runs": batch["runs"][:1]}).status_code == 200
+    assert client.post("/diffusion/batch", json=batch).status_code == 413
+
+
+def test_jobs_have_their_own_budget(client, monkeypatch):
+    cost = main._request_cost(main.SimulationParams(**SMALL_RUN), render=True)
+    limit(monkeypatch, rate=0, burst=0, max_cost=1, max_job_cost=cost - 1)
+    response = client.post("/jobs", json=SMALL_RUN)
+    assert response.status_code == 413
+    assert "submit it as a job" not in response.json()["detail"]
+
+    limit(monkeypatch, rate=0, burst=0, max_cost=1, max_job_cost=cost)
+    assert client.post("/jobs", json=SMALL_RUN).status_code == 202
+
+
+def test_jobs_are_charged_to_the_client(client, monkeypatch):
+    cost = main._request_cost(main.SimulationParams(**SMALL_RUN), render=True)
+    limit(monkeypatch, rate=1, burst=cost, max_cost=cost)
+    assert client.post("/jobs", json=SMALL_RUN).status_code == 202
+
+    response = client.post("/jobs", json=SMALL_RUN)
+    assert response.status_code == 429
+    # A rejected job is not queued
+    assert len(client.get("/jobs").json()) == 1
+
+
+@pytest.mark.parametrize("heavy_cost, heavy", [(1, True), (10 ** 12, False)])
+def test_jobs_take_the_heavy_lane(client, monkeypatch, heavy_cost, heavy):
+    monkeypatch.setattr(config, "HEAVY_REQUEST_COST", heavy_cost)
+    job_id = client.post("/jobs", json=SMALL_RUN).json()["id"]
+    assert main.job_manager.get(job_id).heavy is heavy
+
+
+def test_parallel_runs_are_heavy_and_charged_per_process(monkeypatch):
+    monkeypatch.setattr(config, "PARALLEL_WORKERS", 4)
+    serial = main.SimulationParams(nx=300_000, steps=10, store_frames=2, backend="numpy")
+    parallel = main.SimulationParams(nx=300_000, steps=10, store_frames=2, backend="parallel")
+    serial_cost = main._request_cost(serial, render=False)
+    parallel_cost = main._request_cost(parallel, render=False)
+
+    assert parallel_cost == 4 * serial_cost
+    assert not main._is_heavy(serial, serial_cost)
+    assert main._is_heavy(parallel, parallel_cost)
@@ -0,0 +1,47 @@
+"""Tests that the API rejects incompatible simulation options before running anything."""
+
+import pytest
+
+import main
+
+SMALL_RUN = {"simulation_type": "diffusion", "nx": 20, "steps": 10, "store_frames": 2}
+
+INCOMPATIBLE = [
+    ({"backend": "numpy", "boundary": "periodic"}, "Periodic boundaries need the fipy backend"),
+    ({"backend": "parallel", "boundary": "periodic"}, "Periodic boundaries need the fipy backend"),
+    ({"backend": "analytic", "initial_condition": "top_hat"}, "needs the gaussian initial condition"),
+    ({"backend": "analytic", "simulation_type": "advection_diffusion"}, "no closed form for the advection term"),
+    ({"backend": "analytic", "steps": 100_000}, "stay away from the boundaries"),
+    ({"backend": "fipy", "adaptive": True}, "Adaptive time stepping needs the numpy backend"),
+    ({"backend": "fipy", "mesh": "adaptive"}, "Adaptive meshes need the numpy backend"),
+    ({"backend": "fipy", "scheme": "explicit"}, "only supports the implicit scheme"),
+    ({"backend": "numpy", "ny": 10}, "2D simulations need the fipy backend"),
+    ({"backend": "parallel", "ny": 10}, "2D simulations need the fipy backend"),
+    ({"backend": "numpy", "adaptive": True, "scheme": "explicit"}, "needs the implicit scheme"),
+]
+
+
+@pytest.mark.parametrize("options, message", INCOMPATIBLE)
+def test_incompatible_options_are_rejected(options, message):
+    with pytest.raises(ValueError, match=message):
+        main.SimulationParams(**{**SMALL_RUN, **options})
+
+
+@pytest.mark.parametrize("path", ["/diffusion", "/diffusion/data", "/diffusion/stream", "/jobs"])
+def test_endpoints_reject_incompatible_options(client, path):
+    for options, message in INCOMPATIBLE:
+        response = client.post(path, json={**SMALL_RUN, **options})
+        assert response.status_code == 422, options
+        assert message in str(response.json()["detail"])
+    assert main.job_manager.list() == []
+
+
+def test_compatible_options_are_accepted():
+    for options in [
+        {"backend": "fipy", "boundary": "periodic"},
+        {"backend": "numpy", "adaptive": True, "mesh": "graded"},
+        {"backend": "numpy", "mesh": "adaptive"},
+        {"backend": "analytic", "simulation_type": "heat", "nx": 100},
+        {"backend": "fipy", "ny": 10},
+    ]:
+        main.SimulationParams(**{**SMALL_RUN, **options})
@@ -0,0 +1,15 @@
+"""Tests of the run_simulation entry points."""
+
+import numpy as np
+import pytest
+
+from diffusion_simulation import run_simulation, run_simulation_with_limits
+
+
+@pytest.mark.parametrize("backend", ["fipy", "numpy"])
+def test_limits_match_results(backend):
+    params = {"nx": 40, "k": 1.0, "steps": 30, "store_steps": 6, "backend": backend}
+    results, limits = run_simulation_with_limits("heat", **params)
+
+    np.testing.assert_array_equal(results, run_simulation("heat", **params))
+    assert limits == (float(np.nanmin(results)), float(np.nanmax(results)))
@@ -0,0 +1,153 @@
+"""
+Lifecycle of background jobs: completion, cancellation, the time limit, requeueing and continuation.
+
+Jobs run the real iter_simulation on the numpy backend; a generator that
+stalls between two stored frames stands in for a long solve.
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+
+from diffusion_simulation import iter_simulation
+from jobs import CHECKPOINT_FILE, RESULTS_FILE, JobManager
+from worker_pool import WorkerPool
+
+SIMULATION = {
+    "simulation_type": "diffusion", "nx": 20, "dx": 1.0, "D": 1.0, "steps": 10, "dt": 0.1,
+    "store_steps": 5, "backend": "numpy"
+}
+
+
+def render(request, results, limits):
+    return b"GIF89a"
+
+
+def stalling_simulation(pid_path, **kwargs):
+    """Yield the initial state, record the process id, then stall as a long solve would."""
+    yield np.zeros(kwargs["nx"])
+    with open(pid_path, "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(600)
+    yield np.zeros(kwargs["nx"])
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(max_workers=2, max_queue=0)
+    yield pool
+    pool.shutdown()
+
+
+def make_manager(pool, directory, simulate=iter_simulation, **kwargs):
+    return JobManager(pool, directory=str(directory), simulate=simulate, render=render, **kwargs)
+
+
+async def stall(manager, pool, tmp_path):
+    """Submit a stalling job and wait until its process is in the middle of the solve."""
+    pid_path = tmp_path / "pid"
+    job = await manager.submit({}, {**SIMULATION, "pid_path": str(pid_path)})
+    await wait_for(lambda: pid_path.exists() and pid_path.read_text())
+    assert job.status == "running" and pool.in_flight == 1
+    return job, int(pid_path.read_text())
+
+
+def test_job_completes_and_continues(pool, tmp_path):
+    async def scenario():
+        manager = make_manager(pool, tmp_path / "jobs")
+        await manager.start()
+        try:
+            job = await manager.submit({}, SIMULATION)
+            await wait_for(lambda: job.status == "completed")
+            results = np.load(manager.result_path(job, RESULTS_FILE))
+            assert results.shape == (job.frames_total, SIMULATION["nx"])
+            assert os.path.exists(manager.result_path(job, CHECKPOINT_FILE))
+
+            child = await manager.continue_job(job.id, 10)
+            await wait_for(lambda: child.status in ("completed", "failed"))
+            assert child.status == "completed", child.error
+            assert child.start_time == pytest.approx(job.end_time)
+            continued = np.load(manager.result_path(child, RESULTS_FILE))
+            np.testing.assert_array_equal(continued[0], results[-1])
+        finally:
+            await manager.stop()
+        assert pool.in_flight == 0
+
+    run(scenario())
+
+
+def test_cancel_stops_the_simulation_process(pool, tmp_path):
+    async def scenario():
+        manager = make_manager(pool, tmp_path / "jobs", simulate=stalling_simulation)
+        await manager.start()
+        try:
+            job, pid = await stall(manager, pool, tmp_path)
+            await manager.cancel(job.id)
+            assert job.status == "cancelled"
+            assert not is_running(pid)
+            await wait_for(lambda: pool.in_flight == 0)
+        finally:
+            await manager.stop()
+
+    run(scenario())
+
+
+def test_time_limit_stops_the_simulation_process(pool, tmp_path):
+    async def scenario():
+        manager = make_manager(pool, tmp_path / "jobs", simulate=stalling_simulation, time_limit=1)
+        await manager.start()
+        try:
+            job, pid = await stall(manager, pool, tmp_path)
+            await wait_for(lambda: job.status == "failed")
+            assert "Time limit" in job.error
+            await wait_for(lambda: pool.in_flight == 0)
+            assert not is_running(pid)
+        finally:
+            await manager.stop()
+
+    run(scenario())
+
+
+def test_interrupted_job_is_requeued(pool, tmp_path):
+    async def scenario():
+        manager = make_manager(pool, tmp_path / "jobs", simulate=stalling_simulation)
+        await manager.start()
+        job, pid = await stall(manager, pool, tmp_path)
+        await manager.stop()
+        assert not is_running(pid)
+        assert pool.in_flight == 0
+
+        # A restarted server runs the job again from the start
+        restarted = make_manager(pool, tmp_path / "jobs")
+        job.simulation.pop("pid_path")
+        await restarted._save(job)
+        await restarted.start()
+        try:
+            requeued = restarted.get(job.id)
+            await wait_for(lambda: requeued.status == "completed")
+        finally:
+            await restarted.stop()
+
+    run(scenario())
@@ -0,0 +1,77 @@
+"""
+Parity of the NumPy backend with the FiPy backend.
+
+The implicit scheme is compared with run_simulation on the FiPy backend. FiPy
+has no explicit scheme there, so the explicit scheme is compared with the
+same problem set up in FiPy with an ExplicitDiffusionTerm. Runs stop before
+steady state, where FiPy's default solver may skip a solve (see
+diffusion_simulation.PREFACTORED_TOLERANCE).
+"""
+
+import numpy as np
+import pytest
+
+from diffusion_simulation import run_simulation
+from numpy_backend import run_numpy_simulation, stored_steps
+from problems import get_problem
+
+PARITY_TOLERANCE = 1e-12
+
+CASES = {
+    "diffusion": {"D": 1.0},
+    "heat": {"k": 1.0},
+    "advection_diffusion": {"D": 0.5, "velocity": 1.0},
+}
+
+RUN = {"steps": 20, "dt": 0.1, "store_steps": 5}
+
+
+def run_fipy_explicit(simulation_type: str, nx: int, steps: int, dt: float, store_steps: int, **coefficients) -> np.ndarray:
+    """Run a simulation type in FiPy with forward Euler diffusion, storing the same timesteps as the backends."""
+    from fipy import AdvectionTerm, CellVariable, ExplicitDiffusionTerm, Grid1D, TransientTerm
+
+    problem = get_problem(simulation_type)
+    mesh = Grid1D(nx=nx, dx=1.0)
+    var = CellVariable(mesh=mesh, value=problem.initial_values(np.array(mesh.cellCenters[0]), nx, 1.0))
+    if problem.boundary == "dirichlet":
+        var.constrain(0, mesh.exteriorFaces)
+
+    transient = TransientTerm()
+    if problem.advected:
+        transient = transient + AdvectionTerm(coeff=coefficients["velocity"])
+    eq = transient == ExplicitDiffusionTerm(coeff=coefficients[problem.diffusivity])
+
+    stored = set(stored_steps(steps, store_steps))
+    frames = [np.array(var.value)]
+    for step in range(1, steps + 1):
+        eq.solve(var=var, dt=dt)
+        if step in stored:
+            frames.append(np.array(var.value))
+    return np.array(frames)
+
+
+@pytest.mark.parametrize("nx", [2, 3, 50])
+@pytest.mark.parametrize("simulation_type", sorted(CASES))
+def test_implicit_matches_fipy(simulation_type, nx):
+    coefficients = CASES[simulation_type]
+    reference = run_simulation(simulation_type, nx=nx, backend="fipy", **RUN, **coefficients)
+    results = run_numpy_simulation(simulation_type, nx=nx, scheme="implicit", **RUN, **coefficients)
+
+    assert results.shape == reference.shape
+    assert np.max(np.abs(results - reference)) <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize("nx", [2, 3, 50])
+@pytest.mark.parametrize("simulation_type", sorted(CASES))
+def test_explicit_matches_fipy(simulation_type, nx):
+    coefficients = CASES[simulation_type]
+    reference = run_fipy_explicit(simulation_type, nx=nx, **RUN, **coefficients)
+    results = run_numpy_simulation(simulation_type, nx=nx, scheme="explicit", **RUN, **coefficients)
+
+    assert results.shape == reference.shape
+    assert np.max(np.abs(results - reference)) <= PARITY_TOLERANCE
+
+
+def test_explicit_rejects_unstable_time_step():
+    with pytest.raises(ValueError, match="stability limit"):
+        run_numpy_simulation("diffusion", nx=10, D=1.0, dt=1.0, scheme="explicit")
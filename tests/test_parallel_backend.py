@@ -0,0 +1,69 @@
+"""
+Parity of the parallel backend with the NumPy backend.
+
+MIN_BLOCK_CELLS is lowered so small grids are split into several blocks.
+The block processes, their queue and the shared arrays must all be released
+once a run ends or is abandoned.
+"""
+
+import gc
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import parallel_backend
+from numpy_backend import run_numpy_simulation
+from parallel_backend import block_count, iter_parallel_simulation
+
+PARITY_TOLERANCE = 1e-12
+
+CASES = {
+    "diffusion": {"D": 1.0},
+    "heat": {"k": 1.0},
+    "advection_diffusion": {"D": 0.5, "velocity": 1.0},
+}
+
+RUN = {"nx": 60, "steps": 20, "dt": 0.1, "store_steps": 5}
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(parallel_backend, "MIN_BLOCK_CELLS", 10)
+
+
+def open_descriptors() -> int:
+    """Number of file descriptors open in this process."""
+    gc.collect()
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+@pytest.mark.parametrize("simulation_type", sorted(CASES))
+def test_matches_numpy_backend(simulation_type, workers):
+    assert block_count(RUN["nx"], workers) == workers
+    coefficients = CASES[simulation_type]
+    reference = run_numpy_simulation(simulation_type, **RUN, **coefficients)
+    results = np.array(list(iter_parallel_simulation(simulation_type, workers=workers, **RUN, **coefficients)))
+
+    assert results.shape == reference.shape
+    assert np.max(np.abs(results - reference)) <= PARITY_TOLERANCE * np.max(np.abs(reference))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to count descriptors")
+@pytest.mark.parametrize("frames_read", [None, 2])
+def test_releases_processes_and_shared_memory(frames_read):
+    descriptors = open_descriptors()
+    frames = iter_parallel_simulation("diffusion", D=1.0, workers=3, **RUN)
+    if frames_read is None:
+        list(frames)
+    else:
+        # Abandon the run part way through
+        for _ in range(frames_read):
+            next(frames)
+        frames.close()
+    del frames
+
+    assert multiprocessing.active_children() == []
+    assert open_descriptors() == descriptors
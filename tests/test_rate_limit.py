@@ -0,0 +1,103 @@
+"""Tests of the cost budget, the per-client token buckets and the heavy lane of the worker pool."""
+
+import pytest
+
+from rate_limit import CostLimitError, RateLimitedError, RateLimiter, estimate_cost
+from worker_pool import PoolSaturatedError, WorkerPool
+
+
+class FakeClock:
+    """A clock advanced by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_estimate_cost():
+    assert estimate_cost(100, 10, 5, render=False) == 1000
+    assert estimate_cost(100, 10, 5, ny=4, render=False) == 4000
+    assert estimate_cost(100, 10, 5, cells=30, render=False) == 300
+    # The analytic backend evaluates the stored frames only
+    assert estimate_cost(100, 10, 5, backend="analytic", render=False) == 500
+    assert estimate_cost(100, 10, 5) > estimate_cost(100, 10, 5, render=False)
+    assert estimate_cost(100, 10, 5, solve=False) == estimate_cost(100, 10, 5) - estimate_cost(100, 10, 5, render=False)
+
+
+def test_cost_budget():
+    limiter = RateLimiter(rate=0, burst=0, max_cost=100, max_job_cost=1000)
+    limiter.check_cost(100)
+    limiter.check_cost(1000, job=True)
+    with pytest.raises(CostLimitError, match="submit it as a job"):
+        limiter.check_cost(101)
+    with pytest.raises(CostLimitError) as excinfo:
+        limiter.check_cost(1001, job=True)
+    assert "submit it as a job" not in str(excinfo.value)
+    assert limiter.stats()["rejected_cost"] == 2
+
+
+def test_token_bucket_refills():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=100, max_cost=0, clock=clock)
+    limiter.charge("a", 60)
+    limiter.charge("a", 40)
+    with pytest.raises(RateLimitedError) as excinfo:
+        limiter.charge("a", 30)
+    assert excinfo.value.retry_after == 3
+
+    # Other clients have their own bucket
+    limiter.charge("b", 100)
+
+    clock.now = 3.0
+    limiter.charge("a", 30)
+    assert limiter.stats() == {"clients": 2, "rejected_cost": 0, "rejected_rate": 1}
+
+
+def test_cost_above_burst_takes_the_whole_bucket():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=100, max_cost=0, clock=clock)
+    limiter.charge("a", 10_000)
+    with pytest.raises(RateLimitedError):
+        limiter.charge("a", 1)
+
+
+def test_zero_rate_disables_buckets():
+    limiter = RateLimiter(rate=0, burst=0, max_cost=0)
+    for _ in range(10):
+        limiter.charge("a", 10 ** 12)
+
+
+def test_least_recent_clients_are_dropped():
+    limiter = RateLimiter(rate=1, burst=10, max_cost=0, max_clients=2)
+    for client in "abc":
+        limiter.charge(client, 10)
+    assert limiter.stats()["clients"] == 2
+    # The bucket of "a" was dropped, so it starts full again
+    limiter.charge("a", 10)
+
+
+def test_heavy_requests_leave_workers_to_light_ones():
+    pool = WorkerPool(max_workers=3, max_queue=0, max_heavy=1)
+    heavy = pool.reserve(heavy=True)
+    with pytest.raises(PoolSaturatedError):
+        pool.reserve(heavy=True)
+    # A rejected heavy request does not hold on to a slot
+    assert pool.in_flight == 1
+
+    light = [pool.reserve(), pool.reserve()]
+    with pytest.raises(PoolSaturatedError):
+        pool.reserve()
+    assert (pool.in_flight, pool.heavy_in_flight) == (3, 1)
+
+    heavy.release()
+    with pool.admission(heavy=True):
+        assert pool.heavy_in_flight == 1
+    for reservation in light:
+        reservation.release()
+    assert (pool.in_flight, pool.heavy_in_flight) == (0, 0)
+
+
+def test_cost_counts_every_process():
+    assert estimate_cost(100, 10, 5, render=False, processes=4) == 4 * estimate_cost(100, 10, 5, render=False)
@@ -0,0 +1,435 @@
+"""
+FusionSim Worker Pool
+---------------------
+Runs blocking simulation and rendering work on a bounded process pool so the
+event loop stays free to serve other requests.
+
+Admission is bounded: at most ``max_workers`` jobs run at once and at most
+``max_queue`` more may wait for a free worker. Requests beyond that are
+rejected immediately with ``PoolSaturatedError`` rather than piling up.
+Heavy requests can further be limited to ``max_heavy`` slots, so that some
+workers always stay free for light, latency-sensitive requests.
+
+Besides awaiting a single result, callers can stream the items of a
+generator running in a worker; they are relayed through a bounded
+multiprocessing queue so a slow consumer applies back-pressure to the solver.
+A generator can also be streamed from a process of its own, which is
+terminated as soon as the consumer stops, e.g. for jobs that must stop on
+cancellation however long the generator takes between two items.
+
+An optional initializer runs in every worker process as it starts, e.g. to
+import heavy libraries and warm their caches; ``start()`` starts all workers
+up front and waits until each has run it.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from metrics import call_collecting, observe_phases
+
+logger = logging.getLogger("fusionsim")
+
+# Items buffered between a streaming worker and its consumer
+STREAM_BUFFER_SIZE = 8
+
+# Seconds between checks for a stop request or a finished worker while waiting
+_POLL_INTERVAL = 0.5
+
+# Seconds a terminated streaming process gets to clean up before it is killed
+_TERMINATE_TIMEOUT = 5.0
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when every worker is busy and the admission queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, all simulation workers are in use")
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """
+    An admission slot held until ``release()`` is called.
+
+    Releasing is idempotent, so a slot can safely be released both by the
+    code that used it and by a fallback cleanup path.
+    """
+
+    def __init__(self, pool: "WorkerPool", heavy: bool = False):
+        self._pool = pool
+        self._heavy = heavy
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        """Return the slot to the pool if it has not been returned yet."""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._pool._release_slot(self._heavy)
+
+
+class WorkerPool:
+    """
+    A process pool with a bounded admission queue.
+
+    The underlying executor is created lazily on first use so that importing
+    the server module does not spawn processes.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        retry_after: int = 5,
+        initializer: Optional[Callable[[], None]] = None,
+        max_heavy: Optional[int] = None
+    ):
+        """
+        Args:
+            max_workers: Number of worker processes
+            max_queue: Number of admitted requests allowed to wait for a worker
+            retry_after: Seconds clients should wait before retrying when saturated
+            initializer: Picklable function run in each worker process when it starts
+            max_heavy: Number of admitted heavy requests, running or waiting; None for no limit
+        """
+        if max_workers <= 0:
+            raise ValueError(f"max_workers must be positive, got {max_workers}")
+        if max_queue < 0:
+            raise ValueError(f"max_queue cannot be negative, got {max_queue}")
+        if max_heavy is not None and max_heavy <= 0:
+            raise ValueError(f"max_heavy must be positive, got {max_heavy}")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.max_heavy = max_heavy
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._heavy_slots = threading.BoundedSemaphore(max_heavy) if max_heavy is not None else None
+        self._in_flight = 0
+        self._heavy_in_flight = 0
+        self._lock = threading.Lock()
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[Any] = None
+        self._ready_queue: Optional[Any] = None
+
+    @property
+    def in_flight(self) -> int:
+        """Number of admitted requests, running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def heavy_in_flight(self) -> int:
+        """Number of admitted heavy requests, running or waiting for a worker."""
+        return self._heavy_in_flight
+
+    def reserve(self, heavy: bool = False) -> Reservation:
+        """
+        Reserve a slot that outlives the current call, e.g. a streaming response.
+
+        Args:
+            heavy: Whether the request also needs one of the max_heavy slots
+
+        Raises:
+            PoolSaturatedError: If all workers are busy and the queue is full,
+                or a heavy request finds every heavy slot taken
+        """
+        if heavy and self._heavy_slots is not None and not self._heavy_slots.acquire(blocking=False):
+            raise PoolSaturatedError(self.retry_after)
+        if not self._slots.acquire(blocking=False):
+            if heavy and self._heavy_slots is not None:
+                self._heavy_slots.release()
+            raise PoolSaturatedError(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+            if heavy:
+                self._heavy_in_flight += 1
+        return Reservation(self, heavy=heavy)
+
+    @contextmanager
+    def admission(self, heavy: bool = False) -> Iterator[None]:
+        """
+        Reserve a slot for the duration of a request.
+
+        Args:
+            heavy: Whether the request also needs one of the max_heavy slots
+
+        Raises:
+            PoolSaturatedError: If all workers are busy and the queue is full,
+                or a heavy request finds every heavy slot taken
+        """
+        reservation = self.reserve(heavy=heavy)
+        try:
+            yield
+        finally:
+            reservation.release()
+
+    async def start(self, timeout: float) -> bool:
+        """
+        Start every worker process and wait until each has run the initializer.
+        
+        Without this, workers are started when the first requests arrive and
+        those requests pay for the initialization.
+        
+        Args:
+            timeout: Seconds to wait for the workers
+        
+        Returns:
+            True if every worker was ready within the timeout
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # Workers may be started on demand; one pending call per worker starts all of them
+        for _ in range(self.max_workers):
+            executor.submit(_noop)
+        if self.initializer is None:
+            return True
+        return await loop.run_in_executor(None, self._wait_ready, self.max_workers, timeout)
+    
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a picklable callable in a worker process and await its result.
+
+        Phase timings recorded in the worker (see metrics) are observed here.
+        Callers are expected to hold a slot from ``admission()`` while awaiting.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            result, timings = await loop.run_in_executor(executor, partial(call_collecting, func, *args, **kwargs))
+            observe_phases(timings)
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); start a fresh pool for later requests
+            logger.error("Simulation worker pool is broken, it will be restarted")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    async def stream(self, func: Callable[..., Iterator[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Run a picklable generator function in a worker process and yield its items.
+
+        The worker blocks once ``STREAM_BUFFER_SIZE`` items are waiting, and it
+        stops at its next item when the consumer closes this iterator early.
+        Exceptions raised by the generator are re-raised here. Callers are
+        expected to hold a slot while iterating.
+        """
+        loop = asyncio.get_running_loop()
+        manager = self._get_manager()
+        items = manager.Queue(STREAM_BUFFER_SIZE)
+        stop = manager.Event()
+        future = asyncio.ensure_future(self.run(_pump, items, stop, func, args, kwargs))
+        try:
+            while True:
+                try:
+                    kind, value = await loop.run_in_executor(None, partial(items.get, timeout=_POLL_INTERVAL))
+                except queue.Empty:
+                    if future.done():
+                        # The worker exited without an end marker, e.g. it crashed
+                        future.result()
+                        raise RuntimeError("Streaming worker stopped without finishing")
+                    continue
+                if kind == "item":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+            await future
+        finally:
+            stop.set()
+            if not future.done():
+                future.add_done_callback(_ignore_result)
+
+    async def stream_isolated(self, func: Callable[..., Iterator[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Run a picklable generator function in a process of its own and yield its items.
+
+        Unlike ``stream()``, closing this iterator early terminates the process
+        rather than letting the generator run on to its next item, and waits
+        until it has exited. A long computation between two items therefore
+        never outlives the slot the caller holds while iterating. The process
+        gets SIGTERM first, which exits it through its cleanup code, and is
+        killed if it does not exit within _TERMINATE_TIMEOUT seconds.
+        Exceptions raised by the generator are re-raised here.
+        """
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context()
+        items = context.Queue(STREAM_BUFFER_SIZE)
+        stop = context.Event()
+        process = context.Process(target=_pump_isolated, args=(items, stop, func, args, kwargs), name="fusionsim-stream")
+        process.start()
+        finished = False
+        try:
+            while True:
+                try:
+                    kind, value = await loop.run_in_executor(None, partial(items.get, timeout=_POLL_INTERVAL))
+                except queue.Empty:
+                    if process.is_alive():
+                        continue
+                    try:
+                        # Items sent just before the process exited
+                        kind, value = await loop.run_in_executor(None, partial(items.get, timeout=_POLL_INTERVAL))
+                    except queue.Empty:
+                        raise RuntimeError(f"Streaming process stopped without finishing (exit code {process.exitcode})")
+                if kind == "item":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    observe_phases(value)
+                    finished = True
+                    break
+        finally:
+            stop.set()
+            if not finished and process.is_alive():
+                process.terminate()
+            await loop.run_in_executor(None, _join_or_kill, process)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling work that has not started."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            logger.info("Shutting down simulation worker pool")
+            executor.shutdown(wait=True, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+    def _release_slot(self, heavy: bool = False) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if heavy:
+                self._heavy_in_flight -= 1
+        self._slots.release()
+        if heavy and self._heavy_slots is not None:
+            self._heavy_slots.release()
+
+    def _get_manager(self) -> Any:
+        with self._lock:
+            if self._manager is None:
+                # Queues passed to pool workers must be proxies owned by a manager process
+                self._manager = multiprocessing.Manager()
+            return self._manager
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                logger.info("Starting simulation worker pool with %s processes", self.max_workers)
+                if self.initializer is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    # Workers report on this queue once their initializer has run
+                    if self._ready_queue is None:
+                        self._ready_queue = multiprocessing.Queue()
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=_start_worker,
+                        initargs=(self.initializer, self._ready_queue)
+                    )
+            return self._executor
+    
+    def _wait_ready(self, count: int, timeout: float) -> bool:
+        """Block until count workers have reported ready, or the timeout expires."""
+        deadline = time.monotonic() + timeout
+        for _ in range(count):
+            try:
+                self._ready_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return False
+        return True
+
+
+def _start_worker(initializer: Callable[[], None], ready: Any) -> None:
+    """Run the initializer in a new worker process, then report the worker as ready."""
+    try:
+        initializer()
+    except Exception:
+        # A worker that failed to initialize still serves requests, only more slowly at first
+        logger.exception("Initializer of worker %s failed", os.getpid())
+    ready.put(os.getpid())
+
+
+def _noop() -> None:
+    """Do nothing; submitted to make the executor start its workers."""
+
+
+def _pump(
+    items: Any,
+    stop: Any,
+    func: Callable[..., Iterator[Any]],
+    args: tuple,
+    kwargs: dict,
+    end: bool = True
+) -> bool:
+    """
+    Run a generator in a worker, forwarding its items to a queue, then an end marker unless end is False.
+
+    Returns:
+        Whether every item was forwarded
+    """
+    def put(message: tuple) -> bool:
+        # Wait for room in the queue, giving up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(message, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in func(*args, **kwargs):
+            if not put(("item", item)):
+                return False
+    except Exception as e:
+        put(("error", e))
+        return False
+    if end:
+        put(("end", None))
+    return True
+
+
+def _pump_isolated(items: Any, stop: Any, func: Callable[..., Iterator[Any]], args: tuple, kwargs: dict) -> None:
+    """Body of a process of stream_isolated: run _pump, sending the recorded phase timings with the end marker."""
+    # Exit through finally blocks on terminate(), instead of the handler inherited from the server
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    finished, timings = call_collecting(_pump, items, stop, func, args, kwargs, end=False)
+    if finished:
+        items.put(("end", timings))
+
+
+def _exit_on_signal(signum: int, frame: Any) -> None:
+    sys.exit(128 + signum)
+
+
+def _join_or_kill(process: Any) -> None:
+    """Wait for a process to exit, killing it once _TERMINATE_TIMEOUT has passed."""
+    process.join(_TERMINATE_TIMEOUT)
+    if process.is_alive():
+        logger.warning("Streaming process %s did not exit after SIGTERM, killing it", process.pid)
+        process.kill()
+        process.join()
+
+
+def _ignore_result(future: "asyncio.Future[Any]") -> None:
+    """Retrieve the outcome of an abandoned worker future so it is not logged."""
+    if not future.cancelled():
+        future.exception()